@@ -206,7 +206,7 @@ def train(opts):
         semaphores = []
         mp = torch.multiprocessing.get_context('spawn')
         logger.info("world_size = {}, queue_size = {}".format(opts.world_size, opts.queue_size))
-        # Create a thread to listen for errors in the child processes.
+        # Listen for errors in the child processes, which signal the parent via SIGUSR1.
         error_queue = mp.SimpleQueue()
         error_handler = ErrorHandler(error_queue)
         # Train with multiprocessing.
@@ -1,11 +1,11 @@
 """Module defining low-level comunication utilities (initialization, brodcasting, etc.)"""
-import math
 import os
-import pickle
 import signal
+from collections import deque
 
 import torch
 import torch.distributed
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
 
 from mammoth.utils.logging import init_logger, logger
 from mammoth.utils.misc import set_random_seed
@@ -15,6 +15,9 @@ def multi_init(opts, global_rank):
     dist_init_method = 'tcp://{master_ip}:{master_port}'.format(master_ip=opts.master_ip, master_port=opts.master_port)
 
     dist_world_size = opts.world_size
+    # More sockets and threads per connection speed up NCCL over TCP. Explicit settings take precedence.
+    os.environ.setdefault('NCCL_NSOCKS_PERTHREAD', '4')
+    os.environ.setdefault('NCCL_SOCKET_NTHREADS', '2')
     torch.distributed.init_process_group(
         backend=opts.gpu_backend,
         init_method=dist_init_method,
@@ -35,7 +38,7 @@ def broadcast_tensors(tensors, src=0, group=None):
             torch.distributed.broadcast(t, src, group=group)
 
 
-def only_ready_reduce_and_rescale_grads(named_parameters, group=None):
+def only_ready_reduce_and_rescale_grads(named_parameters, group=None, buffer_size=10485760):
     """
     Gradient synch tolerant to missing grads.
 
@@ -59,9 +62,14 @@ def only_ready_reduce_and_rescale_grads(named_parameters, group=None):
     while devices on which it is not ready communicate a dummy zero tensor
         instead. The sum computed previously is used for normalization.
 
+    In the common case where all parameters are ready on all devices, this is
+    detected by reducing a single flag using a minimum, and the bit masks are
+    not communicated at all.
+
     Args:
         named_parameters: tuples of (str, Parameter) defining the parameters to consider
         group: torch.distributed communication group
+        buffer_size: all-reduce chunk size in bytes
     """
     # Set missing gradients to zero, keeping track of true gradients
     require_grad = [(name, p) for (name, p) in named_parameters if p.requires_grad]
@@ -69,41 +77,75 @@ def only_ready_reduce_and_rescale_grads(named_parameters, group=None):
         # Exit early if the component has no parameters that require a gradient
         return
     device = require_grad[0][1].device
+    if not torch.distributed.is_initialized():
+        world_size = 1
+    elif group is None:
+        world_size = torch.distributed.get_world_size()
+    else:
+        world_size = torch.distributed.get_world_size(group)
     ready_list = []
     for name, p in require_grad:
         if hasattr(p, 'has_grad') and p.has_grad:
-            ready_list.append(1.0)
+            ready_list.append(1)
         else:
-            ready_list.append(0.0)
+            ready_list.append(0)
             if p.grad is None:
                 p.grad = torch.zeros_like(p)
 
+    if world_size == 1:
+        # Nothing to communicate: the local grads are already the result
+        if any(ready_list):
+            _set_missing_has_grad(require_grad, ready_list)
+        return
+
+    # Fast path: if every device has every gradient, a single flag is enough to find out,
+    # and all the gradients share the same denominator.
+    all_ready_t = _get_ready_buffer(device, 1)
+    all_ready_t.fill_(int(all(ready_list)))
+    if group is None:
+        torch.distributed.all_reduce(all_ready_t, op=torch.distributed.ReduceOp.MIN)
+    else:
+        torch.distributed.all_reduce(all_ready_t, op=torch.distributed.ReduceOp.MIN, group=group)
+    if all_ready_t.item() == 1:
+        grads = [p.grad.data for name, p in require_grad]
+        all_reduce_and_rescale_tensors(grads, rescale_denom=world_size, group=group, buffer_size=buffer_size)
+        return
+
     # Communicate the ready bits, and reduce them using summation.
-    # This gives the number of non-dummy gradients participating, for normalization
-    ready_t = torch.tensor(ready_list).to(device)
+    # This gives the number of non-dummy gradients participating, for normalization.
+    # The bits are sent as bytes, unless the sum could overflow them.
+    ready_dtype = torch.uint8 if world_size <= 255 else torch.int32
+    ready_t = _get_ready_buffer(device, len(ready_list), ready_dtype)
+    if ready_t.is_cuda:
+        # stage the bits in pinned memory, so that the copy to the device does not block
+        staging_t = _get_ready_buffer(torch.device('cpu'), len(ready_list), ready_dtype, pin_memory=True)
+        staging_t.numpy()[:] = ready_list
+        ready_t.copy_(staging_t, non_blocking=True)
+    else:
+        ready_t.copy_(torch.tensor(ready_list, dtype=ready_dtype))
     if group is None:
         torch.distributed.all_reduce(ready_t)
     else:
         torch.distributed.all_reduce(ready_t, group=group)
-    rescale_denoms = ready_t  # after reduction
+    # after reduction, copied back to the host once.
+    # This synchronizes, so the staging buffer is free to be reused by the next call.
+    rescale_denoms = ready_t.tolist()
 
     # Omit if all nodes sent a zero ready bit
-    denoms_mask = (rescale_denoms > 0).cpu()
-    params_with_grad = [p for ((name, p), m) in zip(require_grad, denoms_mask) if m]
+    params_with_grad = [p for ((name, p), denom) in zip(require_grad, rescale_denoms) if denom > 0]
     grads = [p.grad.data for p in params_with_grad]
-    rescale_denoms = [denom for (denom, m) in zip(rescale_denoms, denoms_mask) if m]
+    rescale_denoms = [denom for denom in rescale_denoms if denom > 0]
     assert len(grads) == len(rescale_denoms)
     if len(grads) == 0:
         return
 
     # If not, then set has_grad also on devices that did not train the parameter themselves.
     # They now have a grad that they received from the other devices.
-    for name, p in require_grad:
-        p.has_grad = True
+    _set_missing_has_grad(require_grad, ready_list)
 
     # All devices communicate either a real gradient or a dummy zeros of the same size
     # Can not use rescale_denom, as each grad may have its own denominator
-    all_reduce_and_rescale_tensors(grads, rescale_denom=1, group=group)
+    all_reduce_and_rescale_tensors(grads, rescale_denom=1, group=group, buffer_size=buffer_size)
 
     # Normalize using the previously computed values
     for grad, denom in zip(grads, rescale_denoms):
@@ -112,123 +154,141 @@ def only_ready_reduce_and_rescale_grads(named_parameters, group=None):
     # Note: p.has_grad is reused in the optimizer to prevent the untrained components from being stepped
 
 
-def all_reduce_and_rescale_tensors(tensors, rescale_denom, group=None, buffer_size=10485760):
+def _set_missing_has_grad(require_grad, ready_list):
+    """Set has_grad on the parameters that were not ready: it is already True on the others."""
+    for (name, p), ready in zip(require_grad, ready_list):
+        if not ready:
+            p.has_grad = True
+
+
+def _get_ready_buffer(device, numel, dtype=torch.uint8, pin_memory=False):
+    """Return a preallocated tensor of `numel` ready bits on `device`."""
+    if not hasattr(_get_ready_buffer, '_buffers'):
+        _get_ready_buffer._buffers = {}
+    key = (device, numel, dtype, pin_memory)
+    if key not in _get_ready_buffer._buffers:
+        _get_ready_buffer._buffers[key] = torch.zeros(numel, dtype=dtype, device=device, pin_memory=pin_memory)
+    return _get_ready_buffer._buffers[key]
+
+
+def all_reduce_and_rescale_tensors(tensors, rescale_denom, group=None, buffer_size=10485760, max_in_flight=2):
     """
     All-reduce and rescale tensors in chunks of the specified size.
+    Each chunk only contains tensors of the same dtype and device.
+
+    The all-reduces of the chunks are launched asynchronously. Once more than
+    `max_in_flight` of them are pending, the oldest is waited for and copied back,
+    while the next ones are still being reduced. This bounds the memory used by the buffers.
+    When averaging over the whole group with NCCL, the rescaling is done by the all-reduce itself.
 
     Args:
         tensors: list of Tensors to all-reduce
         rescale_denom: denominator for rescaling summed Tensors
         buffer_size: all-reduce chunk size in bytes
+        max_in_flight: number of chunks that can be all-reduced at the same time
     """
-    # buffer size in bytes, determine equiv. # of elements based on data type
-    buffer_t = tensors[0].new(math.ceil(buffer_size / tensors[0].element_size())).zero_()
-    buffer = []
-
-    def all_reduce_buffer():
-        # copy tensors into buffer_t
-        offset = 0
-        for t in buffer:
-            numel = t.numel()
-            buffer_t[offset:offset + numel].copy_(t.view(-1))
-            offset += numel
-
-        # all-reduce and rescale
+    if _can_average_in_all_reduce(rescale_denom, group):
+        op = torch.distributed.ReduceOp.AVG
+        rescale_denom = 1
+    else:
+        op = torch.distributed.ReduceOp.SUM
+    # tuples of (work handle, reduced tensor, tensors to copy the result back into)
+    pending = deque()
+
+    def finish_oldest():
+        # rescale, and copy the all-reduced buffer back into tensors
+        work, reduced_t, buffered = pending.popleft()
+        work.wait()
+        if rescale_denom != 1:
+            reduced_t.div_(rescale_denom)
+        if buffered is not None:
+            for t, synced in zip(buffered, _unflatten_dense_tensors(reduced_t, buffered)):
+                t.copy_(synced)
+
+    def all_reduce_async(t, buffered=None):
         if group is None:
-            torch.distributed.all_reduce(buffer_t[:offset])
+            work = torch.distributed.all_reduce(t, op=op, async_op=True)
         else:
-            torch.distributed.all_reduce(buffer_t[:offset], group=group)
-        buffer_t.div_(rescale_denom)
-
-        # copy all-reduced buffer back into tensors
-        offset = 0
-        for t in buffer:
-            numel = t.numel()
-            t.view(-1).copy_(buffer_t[offset:offset + numel])
-            offset += numel
-
-    filled = 0
+            work = torch.distributed.all_reduce(t, op=op, group=group, async_op=True)
+        pending.append((work, t, buffered))
+        if len(pending) > max_in_flight:
+            finish_oldest()
+
+    def all_reduce_buffer(buffer):
+        # flatten tensors into a buffer of their own, which stays alive until its all-reduce is done
+        all_reduce_async(_flatten_dense_tensors(buffer), buffered=buffer)
+
+    # Tensors are bucketed separately per dtype and device, so that they are never cast when flattened.
+    # The order of the all-reduces only depends on the order of the tensors, so it is the same on all devices.
+    buffers = dict()
     for t in tensors:
         sz = t.numel() * t.element_size()
         if sz > buffer_size:
             # tensor is bigger than buffer, all-reduce and rescale directly
-            if group is None:
-                torch.distributed.all_reduce(t)
-            else:
-                torch.distributed.all_reduce(t, group=group)
-            t.div_(rescale_denom)
-        elif filled + sz > buffer_size:
+            all_reduce_async(t)
+            continue
+        key = (t.dtype, t.device)
+        buffer, filled = buffers.get(key, ([], 0))
+        if filled + sz > buffer_size:
             # buffer is full, all-reduce and replace buffer with grad
-            all_reduce_buffer()
-            buffer = [t]
-            filled = sz
-        else:
-            # add tensor to buffer
-            buffer.append(t)
-            filled += sz
+            all_reduce_buffer(buffer)
+            buffer, filled = [], 0
+        # add tensor to buffer
+        buffer.append(t)
+        buffers[key] = (buffer, filled + sz)
 
-    if len(buffer) > 0:
-        all_reduce_buffer()
+    for buffer, _ in buffers.values():
+        all_reduce_buffer(buffer)
+
+    while pending:
+        finish_oldest()
+
+
+def _can_average_in_all_reduce(rescale_denom, group=None):
+    """Whether rescaling by `rescale_denom` is the ReduceOp.AVG of the group (available with NCCL >= 2.10)."""
+    if not hasattr(torch.distributed.ReduceOp, 'AVG'):
+        return False
+    if group is None:
+        world_size = torch.distributed.get_world_size()
+        backend = torch.distributed.get_backend()
+    else:
+        world_size = torch.distributed.get_world_size(group)
+        backend = torch.distributed.get_backend(group)
+    return rescale_denom == world_size and backend == 'nccl'
 
 
 def all_gather_list(data, max_size=4096):
-    """Gathers arbitrary data from all nodes into a list."""
-    world_size = torch.distributed.get_world_size()
-    if not hasattr(all_gather_list, '_in_buffer') or max_size != all_gather_list._in_buffer.size():
-        all_gather_list._in_buffer = torch.cuda.ByteTensor(max_size)
-        all_gather_list._out_buffers = [torch.cuda.ByteTensor(max_size) for i in range(world_size)]
-    in_buffer = all_gather_list._in_buffer
-    out_buffers = all_gather_list._out_buffers
-
-    enc = pickle.dumps(data)
-    enc_size = len(enc)
-    if enc_size + 2 > max_size:
-        raise ValueError('encoded data exceeds max_size: {}'.format(enc_size + 2))
-    assert max_size < 255 * 256
-    in_buffer[0] = enc_size // 255  # this encoding works for max_size < 65k
-    in_buffer[1] = enc_size % 255
-    in_buffer[2:enc_size + 2] = torch.ByteTensor(list(enc))
-
-    torch.distributed.all_gather(out_buffers, in_buffer.cuda())
-
-    results = []
-    for i in range(world_size):
-        out_buffer = out_buffers[i]
-        size = (255 * out_buffer[0].item()) + out_buffer[1].item()
-
-        bytes_list = bytes(out_buffer[2:size + 2].tolist())
-        result = pickle.loads(bytes_list)
-        results.append(result)
+    """Gathers arbitrary picklable data from all nodes into a list.
+
+    `max_size` is kept for backwards compatibility and ignored: the data is not limited in size.
+    """
+    results = [None] * torch.distributed.get_world_size()
+    torch.distributed.all_gather_object(results, data)
     return results
 
 
 class ErrorHandler(object):
     """A class that listens for exceptions in children processes and propagates
-    the tracebacks to the parent process."""
+    the tracebacks to the parent process.
+
+    A failing child puts its traceback on the error queue and then signals the parent
+    with SIGUSR1, so no listener thread is needed in the parent."""
 
     def __init__(self, error_queue):
         """init error handler"""
-        import signal
-        import threading
-
         self.error_queue = error_queue
         self.children_pids = []
-        self.error_thread = threading.Thread(target=self.error_listener, daemon=True)
-        self.error_thread.start()
         signal.signal(signal.SIGUSR1, self.signal_handler)
 
     def add_child(self, pid):
         """error handler"""
         self.children_pids.append(pid)
 
-    def error_listener(self):
-        """error listener"""
-        (rank, original_trace) = self.error_queue.get()
-        self.error_queue.put((rank, original_trace))
-        os.kill(os.getpid(), signal.SIGUSR1)
-
     def signal_handler(self, signalnum, stackframe):
         """signal handler"""
+        # Only the first failing child is reported: ignore the signals of the others,
+        # which usually fail as a consequence while this exception is propagating.
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
         for pid in self.children_pids:
             os.kill(pid, signal.SIGINT)  # kill children processes
         (rank, original_trace) = self.error_queue.get()
@@ -281,3 +341,5 @@ def consumer(process_fn, opts, device_context, error_queue, batch_queue, semapho
         import traceback
 
         error_queue.put((opts.gpu_ranks[device_context.node_rank], traceback.format_exc()))
+        # wake up the ErrorHandler of the parent process
+        os.kill(os.getppid(), signal.SIGUSR1)
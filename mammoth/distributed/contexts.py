@@ -8,17 +8,21 @@ class DeviceContextEnum(Enum):
     MULTI_GPU = 3
 
 
-@dataclass
+@dataclass(frozen=True)
 class WorldContext:
     context: DeviceContextEnum
     # Size of the world: total number of nodes, gpus on each node
     n_nodes: int
     gpus_per_node: int
 
+    def __post_init__(self):
+        # The context does not change after creation: precompute the derived values
+        object.__setattr__(self, '_world_size', self.n_nodes * self.gpus_per_node)
+
     @property
     def world_size(self):
         """Total number of training GPUs"""
-        return self.n_nodes * self.gpus_per_node
+        return self._world_size
 
     def is_distributed(self):
         """When training is distributed over several devices,
@@ -70,22 +74,24 @@ class WorldContext:
         return world_context
 
 
-@dataclass
+@dataclass(frozen=True)
 class DeviceContext(WorldContext):
     # Our place in the world
     node_rank: int
     local_rank: int
 
+    def __post_init__(self):
+        super().__post_init__()
+        object.__setattr__(self, '_global_rank', self.gpus_per_node * self.node_rank + self.local_rank)
+        object.__setattr__(self, '_id', f'GPU {self.node_rank}:{self.local_rank}' if self.is_gpu() else 'CPU')
+
     @property
     def global_rank(self) -> int:
-        return self.gpus_per_node * self.node_rank + self.local_rank
+        return self._global_rank
 
     @property
     def id(self) -> str:
-        if self.is_gpu():
-            return f'GPU {self.node_rank}:{self.local_rank}'
-        else:
-            return 'CPU'
+        return self._id
 
     def is_master(self):
         """For code that should only run in one process:
@@ -1,7 +1,7 @@
 """sub-module defining tasks, task specifications and task management objects."""
 from abc import ABC, abstractmethod
 from argparse import Namespace
-from collections import OrderedDict, namedtuple, Counter
+from collections import namedtuple, Counter
 from dataclasses import dataclass
 from itertools import cycle, islice
 from pprint import pformat
@@ -65,6 +65,13 @@ class WeightedSamplingTaskDistributionStrategy(TaskDistributionStrategy):
         if all(weight == 0 or start > 0 for (weight, start) in zip(my_weights, my_introduce_at_training_step)):
             raise ValueError('Invalid curriculum: no corpus is ready to start in the first step')
 
+        self._weights = np.asarray(my_weights, dtype=np.float64)
+        self._introduce_at_training_step = np.asarray(my_introduce_at_training_step, dtype=np.int64)
+        self._corpus_ids = np.asarray(my_corpus_ids, dtype=object)
+        # The valid tasks only change when a curriculum starting point is reached
+        self._introduction_steps = np.unique(self._introduce_at_training_step)
+        self._p_by_stage = dict()
+
     @classmethod
     def from_opts(cls, my_corpus_ids: List[str], opts: dict):
         my_weights = [opts.tasks[corpus_id]['weight'] for corpus_id in my_corpus_ids]
@@ -78,17 +85,17 @@ class WeightedSamplingTaskDistributionStrategy(TaskDistributionStrategy):
         n_samples: int,
         communication_batch_id: int,
     ):
-        weights = [
-            weight if introduce_at_training_step <= communication_batch_id else 0
-            for (corpus_id, weight, introduce_at_training_step) in zip(
-                self.my_corpus_ids, self.my_weights, self.my_introduce_at_training_step
-            )
-        ]
-        sum_w = sum(weights)
-        assert sum_w > 0
-        p = [weight / sum_w for weight in weights]
+        stage = int(np.searchsorted(self._introduction_steps, communication_batch_id, side='right'))
+        p = self._p_by_stage.get(stage, None)
+        if p is None:
+            weights = np.where(self._introduce_at_training_step <= communication_batch_id, self._weights, 0.0)
+            sum_w = weights.sum()
+            assert sum_w > 0
+            p = weights / sum_w
+            self._p_by_stage[stage] = p
         # sampling with replacement from weighted corpora (language pairs)
-        sampled_corpus_ids = np.random.choice(self.my_corpus_ids, size=n_samples, p=p)
+        sampled_indices = np.random.choice(len(self._corpus_ids), size=n_samples, p=p)
+        sampled_corpus_ids = self._corpus_ids[sampled_indices].tolist()
         return sampled_corpus_ids
 
 
@@ -127,6 +134,25 @@ DatasetMetadata = namedtuple(
 
 @dataclass
 class TaskSpecs():
+    # There can be thousands of tasks: avoid a per-instance __dict__.
+    # (dataclass(slots=True) would require python 3.10)
+    __slots__ = (
+        'node_rank',
+        'local_rank',
+        'src_lang',
+        'tgt_lang',
+        'encoder_id',
+        'decoder_id',
+        'corpus_id',
+        'weight',
+        'corpus_opts',
+        'src_vocab',
+        'tgt_vocab',
+        'encoder_adapter_ids',
+        'decoder_adapter_ids',
+        '_metadata',
+    )
+
     node_rank: int
     local_rank: int
     src_lang: str
@@ -141,28 +167,34 @@ class TaskSpecs():
     encoder_adapter_ids: Optional[List[Tuple[int, str, str]]]
     decoder_adapter_ids: Optional[List[Tuple[int, str, str]]]
 
+    def __post_init__(self):
+        # The metadata of a task does not change: build it once
+        self._metadata = DatasetMetadata(
+            self.src_lang,
+            self.tgt_lang,
+            self.encoder_id,
+            self.decoder_id,
+            self.corpus_id,
+            self.encoder_adapter_ids,
+            self.decoder_adapter_ids,
+        )
+
     def get_serializable_metadata(self):
         """
         TaskSpecs contains objects that should not be serialized
         and sent over the multiprocessing message queue.
         The DatasetMetadata namedtuple can be serialized.
         """
-        return DatasetMetadata(
-            src_lang=self.src_lang,
-            tgt_lang=self.tgt_lang,
-            encoder_id=self.encoder_id,
-            decoder_id=self.decoder_id,
-            corpus_id=self.corpus_id,
-            encoder_adapter_ids=self.encoder_adapter_ids,
-            decoder_adapter_ids=self.decoder_adapter_ids,
-        )
+        return self._metadata
 
 
 def get_adapter_ids(opts, corpus_opts, side):
     if 'adapters' not in opts or 'adapters' not in corpus_opts:
         return []
-    global_adapters_opt = opts.adapters.get(side, None)
-    corpus_adapter_opt = corpus_opts['adapters'].get(side, None)
+    return _get_adapter_ids(opts.adapters.get(side, None), corpus_opts['adapters'].get(side, None))
+
+
+def _get_adapter_ids(global_adapters_opt, corpus_adapter_opt):
     if not global_adapters_opt or not corpus_adapter_opt:
         return []
     result = []
@@ -209,8 +241,23 @@ class TaskQueueManager:
 
         self.components_to_gpus = components_to_gpus
         self.components_to_groups = components_to_groups
+        # global_rank -> the part of components_to_groups on that gpu, see get_distributed_groups
+        self._groups_by_rank = None
+        # sorted tuple of global ranks -> the process group shared by all components on those gpus
+        self._rankset_to_group = None
         self.sampled_task_counts = Counter()
 
+        # The tasks and device of a TQM do not change after construction,
+        # so the results of the getters below are computed once and cached.
+        self._encoders_by_layer = dict()
+        self._decoders_by_layer = dict()
+        self._src_langs = None
+        self._tgt_langs = None
+        # Index of the tasks on each device, in the original order
+        self._tasks_by_device = dict()
+        for task in self.tasks:
+            self._tasks_by_device.setdefault((task.node_rank, task.local_rank), []).append(task)
+
     @property
     def gpus_per_node(self):
         return self.world_context.gpus_per_node
@@ -233,29 +280,27 @@ class TaskQueueManager:
 
     @classmethod
     def from_opts(cls, opts: Namespace, world_context: WorldContext):
-        n_tasks = len(opts.tasks)
+        tasks_opts = opts.tasks
+        n_tasks = len(tasks_opts)
 
         # Sorting the keys, to ensure that tasks have a consistent order across devices.
         # This in turn ensures the order in which components are created from those tasks.
-        corpus_ids = sorted(opts.tasks.keys())
+        corpus_ids = sorted(tasks_opts.keys())
+        all_corpus_opts = [tasks_opts[corpus_id] for corpus_id in corpus_ids]
 
         if world_context.is_distributed():
-            if any(task.get('node_gpu', None) is not None for task in opts.tasks.values()):
+            if any(task.get('node_gpu', None) is not None for task in tasks_opts.values()):
                 node_gpu = [
-                    tuple(int(y) for y in opts.tasks[corpus_id]['node_gpu'].split(':', 1))
-                    for corpus_id in corpus_ids]
+                    tuple(int(y) for y in corpus_opts['node_gpu'].split(':', 1))
+                    for corpus_opts in all_corpus_opts]
             else:
                 # When --node_gpu is not set, assume an assigment that fills gpus in rank order
                 node_gpu = cls._default_node_gpu(n_tasks, world_context.n_nodes, world_context.gpus_per_node)
         else:
             node_gpu = [(0, 0)] * n_tasks
 
-        enc_sharing_group = [
-            opts.tasks[corpus_id].get('enc_sharing_group', None) for corpus_id in corpus_ids
-        ]
-        dec_sharing_group = [
-            opts.tasks[corpus_id].get('dec_sharing_group', None) for corpus_id in corpus_ids
-        ]
+        enc_sharing_group = [corpus_opts.get('enc_sharing_group', None) for corpus_opts in all_corpus_opts]
+        dec_sharing_group = [corpus_opts.get('dec_sharing_group', None) for corpus_opts in all_corpus_opts]
         if any(x is not None for x in enc_sharing_group):
             assert all(len(enc_ids) == len(opts.enc_layers) for enc_ids in enc_sharing_group)
         else:
@@ -271,23 +316,26 @@ class TaskQueueManager:
             if not len(opts.dec_layers) == 1:
                 raise Exception('With more than one decoder stack, you must explictly define dec_sharing_group')
 
+        # The global adapter options are the same for all tasks
+        global_adapters_opt = opts.adapters if 'adapters' in opts else None
+        encoder_adapters_opt = global_adapters_opt.get('encoder', None) if global_adapters_opt else None
+        decoder_adapters_opt = global_adapters_opt.get('decoder', None) if global_adapters_opt else None
+
         tasks = []
         uses_adapters = False
-        for (
-            (node_rank, local_rank),
-            corpus_id
-        ) in zip(
-            node_gpu,
-            corpus_ids
-        ):
-            corpus_opts = opts.tasks[corpus_id]
+        for (node_rank, local_rank), corpus_id, corpus_opts in zip(node_gpu, corpus_ids, all_corpus_opts):
             src_lang, tgt_lang = corpus_opts['src_tgt'].split('-', 1)
             encoder_id = corpus_opts.get('enc_sharing_group', [src_lang])
             decoder_id = corpus_opts.get('dec_sharing_group', [tgt_lang])
             weight = corpus_opts.get('weight', 1.0)
             if 'adapters' in corpus_opts:
-                encoder_adapter_ids = get_adapter_ids(opts, corpus_opts, 'encoder')
-                decoder_adapter_ids = get_adapter_ids(opts, corpus_opts, 'decoder')
+                if global_adapters_opt is None:
+                    encoder_adapter_ids = []
+                    decoder_adapter_ids = []
+                else:
+                    corpus_adapters = corpus_opts['adapters']
+                    encoder_adapter_ids = _get_adapter_ids(encoder_adapters_opt, corpus_adapters.get('encoder', None))
+                    decoder_adapter_ids = _get_adapter_ids(decoder_adapters_opt, corpus_adapters.get('decoder', None))
                 uses_adapters = True
             else:
                 encoder_adapter_ids = None
@@ -363,7 +411,7 @@ class TaskQueueManager:
         return f'{self.__class__.__name__}(\n{kwargs}\n)'
 
     def _tasks_on_device(self, node_rank, local_rank):
-        return [task for task in self.tasks if (task.node_rank, task.local_rank) == (node_rank, local_rank)]
+        return self._tasks_by_device.get((node_rank, local_rank), [])
 
     def get_tasks(self):
         if not self.device_context:
@@ -389,9 +437,11 @@ class TaskQueueManager:
         if not self.world_context.is_distributed():
             self.components_to_gpus = dict()
             self.components_to_groups = dict()
+            self._groups_by_rank = dict()
+            self._rankset_to_group = dict()
             return self.components_to_groups
 
-        # Single OrderedDict contains all components.
+        # Single dict contains all components (dicts preserve insertion order).
         # Keys are tuples of strings.
         # The length of the key varies depending on the component:
         # ('encoder', layer_stack_index, encoder_id)
@@ -400,55 +450,60 @@ class TaskQueueManager:
         # ('tgt_emb', lang)
         # ('encoder_adapters', layer_stack_index, encoder_id, adapter_group, sub_id)
         # ('decoder_adapters', layer_stack_index, decoder_id, adapter_group, sub_id)
-        self.components_to_gpus = OrderedDict()
-
-        for node_rank in range(self.n_nodes):
-            for local_rank in range(self.gpus_per_node):
-                global_rank = node_rank * self.gpus_per_node + local_rank
-                tasks = self._tasks_on_device(node_rank, local_rank)
-
-                for task in tasks:
-                    keys = [
-                        ('src_emb', task.src_lang),
-                        ('tgt_emb', task.tgt_lang),
-                    ]
-                    for layer_stack_index, encoder_id in enumerate(task.encoder_id):
-                        keys.append(('encoder', layer_stack_index, encoder_id))
-                    for layer_stack_index, decoder_id in enumerate(task.decoder_id):
-                        keys.append(('decoder', layer_stack_index, decoder_id))
-                    for key in keys:
-                        # Using setdefault to treat OrderedDict as defaultdict
-                        self.components_to_gpus.setdefault(key, set()).add(global_rank)
-
-                    if task.encoder_adapter_ids:
-                        for layer_stack_index, adapter_group, sub_id in task.encoder_adapter_ids:
-                            encoder_id = task.encoder_id[layer_stack_index]
-                            key = ('encoder_adapters', layer_stack_index, encoder_id, adapter_group, sub_id)
-                            self.components_to_gpus.setdefault(key, set()).add(global_rank)
-                    if task.decoder_adapter_ids:
-                        for layer_stack_index, adapter_group, sub_id in task.decoder_adapter_ids:
-                            decoder_id = task.decoder_id[layer_stack_index]
-                            key = ('decoder_adapters', layer_stack_index, decoder_id, adapter_group, sub_id)
-                            self.components_to_gpus.setdefault(key, set()).add(global_rank)
-
-        # Structured, each component in a separate OrderedDict
+        self.components_to_gpus = dict()
+
+        # A single pass over the tasks, in rank order (the sort is stable, so the order of
+        # the tasks on each device is kept). This fixes the order in which groups are created.
+        for task in sorted(self.tasks, key=lambda task: (task.node_rank, task.local_rank)):
+            global_rank = task.node_rank * self.gpus_per_node + task.local_rank
+            # Using setdefault to treat dict as defaultdict
+            self.components_to_gpus.setdefault(('src_emb', task.src_lang), set()).add(global_rank)
+            self.components_to_gpus.setdefault(('tgt_emb', task.tgt_lang), set()).add(global_rank)
+            for layer_stack_index, encoder_id in enumerate(task.encoder_id):
+                self.components_to_gpus.setdefault(('encoder', layer_stack_index, encoder_id), set()).add(global_rank)
+            for layer_stack_index, decoder_id in enumerate(task.decoder_id):
+                self.components_to_gpus.setdefault(('decoder', layer_stack_index, decoder_id), set()).add(global_rank)
+
+            if task.encoder_adapter_ids:
+                for layer_stack_index, adapter_group, sub_id in task.encoder_adapter_ids:
+                    encoder_id = task.encoder_id[layer_stack_index]
+                    key = ('encoder_adapters', layer_stack_index, encoder_id, adapter_group, sub_id)
+                    self.components_to_gpus.setdefault(key, set()).add(global_rank)
+            if task.decoder_adapter_ids:
+                for layer_stack_index, adapter_group, sub_id in task.decoder_adapter_ids:
+                    decoder_id = task.decoder_id[layer_stack_index]
+                    key = ('decoder_adapters', layer_stack_index, decoder_id, adapter_group, sub_id)
+                    self.components_to_gpus.setdefault(key, set()).add(global_rank)
+
+        # Structured, each component in a separate dict
         self.components_to_groups = {
-            component_type: OrderedDict() for component_type
+            component_type: dict() for component_type
             in ('encoder', 'decoder', 'src_emb', 'tgt_emb')
         }
         if self.uses_adapters:
-            self.components_to_groups['encoder_adapters'] = OrderedDict()
-            self.components_to_groups['decoder_adapters'] = OrderedDict()
+            self.components_to_groups['encoder_adapters'] = dict()
+            self.components_to_groups['decoder_adapters'] = dict()
+        # Components on the same set of gpus share one process group.
+        # Every rank creates the same groups in the same order, as torch.distributed requires.
+        rankset_to_group = dict()
         for key, global_ranks in self.components_to_gpus.items():
             if len(global_ranks) < 2:
                 # only create a process group if the component is on 2 or more gpus
                 continue
-            sorted_global_ranks = list(sorted(global_ranks))
-            min_rank = sorted_global_ranks[0]
-            group_tpl = (min_rank, new_group_func(sorted_global_ranks))
+            rankset = tuple(sorted(global_ranks))
+            if rankset not in rankset_to_group:
+                if len(rankset) == self.world_context.world_size:
+                    # the component is on all gpus: the default group already covers them
+                    rankset_to_group[rankset] = torch.distributed.group.WORLD
+                else:
+                    rankset_to_group[rankset] = new_group_func(list(rankset))
+            min_rank = rankset[0]
+            group_tpl = (min_rank, rankset_to_group[rankset])
             component_type = key[0]
             component_id = key[1:]
-            self.components_to_groups.setdefault(component_type, OrderedDict())[component_id] = group_tpl
+            self.components_to_groups.setdefault(component_type, dict())[component_id] = group_tpl
+        self._groups_by_rank = self._index_groups_by_rank()
+        self._rankset_to_group = rankset_to_group
 
         return self.components_to_groups
 
@@ -470,37 +525,65 @@ class TaskQueueManager:
         if self.components_to_groups is None:
             self.create_all_distributed_groups(new_group_func)
         logger.info(f'components_to_groups: {self.components_to_groups}')
-
-        my_distributed_groups = {
-            'encoder': OrderedDict(),
-            'decoder': OrderedDict(),
-            'src_emb': OrderedDict(),
-            'tgt_emb': OrderedDict(),
-            'encoder_adapters': OrderedDict(),
-            'decoder_adapters': OrderedDict(),
+        if self._groups_by_rank is None:
+            # The groups were created by another TaskQueueManager
+            self._groups_by_rank = self._index_groups_by_rank()
+        if self.global_rank not in self._groups_by_rank:
+            # omit groups that are not on this device: no component on this device is shared
+            return self._empty_groups()
+        return self._groups_by_rank[self.global_rank]
+
+    def get_rankset_groups(self):
+        """
+        Returns a dict of rankset -> process_group, where the rankset is the sorted tuple
+        of the global ranks of the gpus sharing the group.
+        All components on the same set of gpus share a single process group,
+        so their gradients can be communicated together.
+        Only the groups including this GPU are returned, in a consistent order across GPUs.
+        """
+        if self.components_to_groups is None:
+            raise Exception('Must call get_distributed_groups first')
+        if self._rankset_to_group is None:
+            # The groups were created by another TaskQueueManager
+            self._rankset_to_group = dict()
+            for component_type, groups in self.components_to_groups.items():
+                for component_id, (_, group) in groups.items():
+                    rankset = tuple(sorted(self.components_to_gpus[(component_type, *component_id)]))
+                    self._rankset_to_group.setdefault(rankset, group)
+        if self.device_context is None:
+            return dict(self._rankset_to_group)
+        return {
+            rankset: group for rankset, group in self._rankset_to_group.items()
+            if self.global_rank in rankset
         }
 
-        if self.global_rank is None:
-            # Training on CPU, or called on global TaskQueueManager
-            for component_type, components in self.components_to_groups.items():
-                my_distributed_groups[component_type] = components
-
-        global_rank = self.global_rank
-
-        for key, global_ranks in self.components_to_gpus.items():
-            if global_rank not in global_ranks:
-                # omit groups that are not on this device
-                continue
-            component_type = key[0]
-            component_id = key[1:]
-            if component_id not in self.components_to_groups[component_type]:
-                # omit components on a single device
-                logger.info(f'{component_type} {component_id} is on a single device')
-                continue
-            my_distributed_groups[component_type][component_id] = \
-                self.components_to_groups[component_type][component_id]
+    @staticmethod
+    def _empty_groups():
+        return {
+            'encoder': dict(),
+            'decoder': dict(),
+            'src_emb': dict(),
+            'tgt_emb': dict(),
+            'encoder_adapters': dict(),
+            'decoder_adapters': dict(),
+        }
 
-        return my_distributed_groups
+    def _index_groups_by_rank(self):
+        """
+        Returns a dict of global_rank -> component_type -> component_id -> (min_rank, process_group),
+        with only the components present on each GPU, in a consistent order across GPUs.
+        Components on a single device have no group, and are omitted.
+        """
+        groups_by_rank = dict()
+        # Walking the groups, rather than components_to_gpus, reuses the component_id tuples
+        # already stored in components_to_groups instead of slicing a new copy for every rank.
+        for component_type, groups in self.components_to_groups.items():
+            for component_id, group_tpl in groups.items():
+                for global_rank in self.components_to_gpus[(component_type, *component_id)]:
+                    if global_rank not in groups_by_rank:
+                        groups_by_rank[global_rank] = self._empty_groups()
+                    groups_by_rank[global_rank][component_type][component_id] = group_tpl
+        return groups_by_rank
 
     def get_grouped_components(self, model):
         """
@@ -513,12 +596,12 @@ class TaskQueueManager:
             raise Exception('Must call get_distributed_groups first')
 
         my_grouped_components = {
-            'encoder': OrderedDict(),
-            'decoder': OrderedDict(),
-            'src_emb': OrderedDict(),
-            'tgt_emb': OrderedDict(),
-            'encoder_adapters': OrderedDict(),
-            'decoder_adapters': OrderedDict(),
+            'encoder': dict(),
+            'decoder': dict(),
+            'src_emb': dict(),
+            'tgt_emb': dict(),
+            'encoder_adapters': dict(),
+            'decoder_adapters': dict(),
         }
 
         if not self.world_context.is_distributed():
@@ -526,31 +609,38 @@ class TaskQueueManager:
         else:
             tasks = self.get_tasks()
 
+        src_embeddings = model.encoder.embeddings
+        tgt_embeddings = model.decoder.embeddings
+        # Many tasks share the same components: only look up each of them once
+        my_encoders = my_grouped_components['encoder']
+        my_decoders = my_grouped_components['decoder']
         for task in tasks:
             # loop over my tasks, getting all the relevant module ids and modules
-            my_grouped_components['src_emb'][task.src_lang] = model.encoder.embeddings[f'embeddings_{task.src_lang}']
-            my_grouped_components['tgt_emb'][task.tgt_lang] = model.decoder.embeddings[f'embeddings_{task.tgt_lang}']
+            if task.src_lang not in my_grouped_components['src_emb']:
+                my_grouped_components['src_emb'][task.src_lang] = src_embeddings[f'embeddings_{task.src_lang}']
+            if task.tgt_lang not in my_grouped_components['tgt_emb']:
+                my_grouped_components['tgt_emb'][task.tgt_lang] = tgt_embeddings[f'embeddings_{task.tgt_lang}']
             for layer_stack_index, encoder_id in enumerate(task.encoder_id):
-                component = model.encoder.get_submodule(layer_stack_index, encoder_id)
-                my_grouped_components['encoder'][(layer_stack_index, encoder_id)] = component
+                if (layer_stack_index, encoder_id) not in my_encoders:
+                    my_encoders[(layer_stack_index, encoder_id)] = model.encoder.get_submodule(
+                        layer_stack_index, encoder_id
+                    )
             for layer_stack_index, decoder_id in enumerate(task.decoder_id):
-                component = model.decoder.get_submodule(layer_stack_index, decoder_id)
-                my_grouped_components['decoder'][(layer_stack_index, decoder_id)] = component
+                if (layer_stack_index, decoder_id) not in my_decoders:
+                    my_decoders[(layer_stack_index, decoder_id)] = model.decoder.get_submodule(
+                        layer_stack_index, decoder_id
+                    )
             if task.encoder_adapter_ids:
                 for layer_stack_index, adapter_group, sub_id in task.encoder_adapter_ids:
                     encoder_id = task.encoder_id[layer_stack_index]
                     key = (layer_stack_index, encoder_id, adapter_group, sub_id)
-                    component = model.encoder.get_submodule(
-                        layer_stack_index, encoder_id
-                    ).get_adapter(adapter_group, sub_id)
+                    component = my_encoders[(layer_stack_index, encoder_id)].get_adapter(adapter_group, sub_id)
                     my_grouped_components['encoder_adapters'][key] = component
             if task.decoder_adapter_ids:
                 for layer_stack_index, adapter_group, sub_id in task.decoder_adapter_ids:
                     decoder_id = task.decoder_id[layer_stack_index]
                     key = (layer_stack_index, decoder_id, adapter_group, sub_id)
-                    component = model.decoder.get_submodule(
-                        layer_stack_index, decoder_id
-                    ).get_adapter(adapter_group, sub_id)
+                    component = my_decoders[(layer_stack_index, decoder_id)].get_adapter(adapter_group, sub_id)
                     my_grouped_components['decoder_adapters'][key] = component
 
         return my_grouped_components
@@ -576,18 +666,10 @@ class TaskQueueManager:
         component_id:   None
         vocabs_dict:    The actual vocabs.
         """
-        seen = set()
-        result = []
         component_id = None     # for hysterical raisins
-        for task in self.get_tasks():
-            if side == 'src':
-                lang = task.src_lang
-            else:
-                lang = task.tgt_lang
-            if not (side, lang, component_id) in seen:
-                result.append((side, lang, component_id, vocabs_dict[(side, lang)]))
-            seen.add((side, lang, component_id))
-        return result
+        langs = self.get_src_langs() if side == 'src' else self.get_tgt_langs()
+        # dict keys deduplicate the languages, keeping the order of first appearance
+        return [(side, lang, component_id, vocabs_dict[(side, lang)]) for lang in dict.fromkeys(langs)]
 
     def sample_corpus_ids(self, communication_batch_id: int):
         corpus_id = self.task_distribution_strategy.sample_corpus_ids(
@@ -599,26 +681,36 @@ class TaskQueueManager:
         return corpus_ids
 
     def get_encoders(self, layer_stack_index: int):
-        my_encoder_ids = [task.encoder_id[layer_stack_index] for task in self.get_tasks()]
-        return my_encoder_ids
+        if layer_stack_index not in self._encoders_by_layer:
+            self._encoders_by_layer[layer_stack_index] = [
+                task.encoder_id[layer_stack_index] for task in self.get_tasks()
+            ]
+        return self._encoders_by_layer[layer_stack_index]
 
     def get_decoders(self, layer_stack_index: int):
-        my_decoder_ids = [task.decoder_id[layer_stack_index] for task in self.get_tasks()]
-        return my_decoder_ids
+        if layer_stack_index not in self._decoders_by_layer:
+            self._decoders_by_layer[layer_stack_index] = [
+                task.decoder_id[layer_stack_index] for task in self.get_tasks()
+            ]
+        return self._decoders_by_layer[layer_stack_index]
 
     def get_src_langs(self):
-        return [task.src_lang for task in self.get_tasks()]
+        if self._src_langs is None:
+            self._src_langs = [task.src_lang for task in self.get_tasks()]
+        return self._src_langs
 
     def get_tgt_langs(self):
-        return [task.tgt_lang for task in self.get_tasks()]
+        if self._tgt_langs is None:
+            self._tgt_langs = [task.tgt_lang for task in self.get_tasks()]
+        return self._tgt_langs
 
     def get_generators(self):
-        return [task.tgt_lang for task in self.get_tasks()]
+        return self.get_tgt_langs()
 
     def get_langs(self, side):
         if side == 'src':
-            return [task.src_lang for task in self.get_tasks()]
+            return self.get_src_langs()
         elif side == 'tgt':
-            return [task.tgt_lang for task in self.get_tasks()]
+            return self.get_tgt_langs()
         else:
             raise ValueError(f'side "{side}" not in {{src, tgt}}')
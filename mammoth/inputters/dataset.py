@@ -37,8 +37,14 @@ def read_examples_from_files(
     transforms_fn=lambda x: x,
     stride=None,
     offset=None,
+    batch_transforms_fn=None,
+    transforms_batch_size=1024,
 ):
-    """Helper function to read examples"""
+    """Helper function to read examples.
+
+    If `batch_transforms_fn` is set, it is used instead of `transforms_fn`
+    and applied to lists of `transforms_batch_size` examples at a time.
+    """
 
     def _make_example_dict(packed):
         """Helper function to convert lines to dicts"""
@@ -65,8 +71,13 @@ def read_examples_from_files(
         # Start by skipping offset examples. After that return every stride:th example.
         examples = itertools.islice(examples, offset, None, stride)
     examples = map(_make_example_dict, examples)
-    examples = map(transforms_fn, examples)
-    examples = filter(None, examples)  # filtertoolong replaces invalid examples with None
+    if batch_transforms_fn is not None:
+        unbatched = examples
+        batches = iter(lambda: list(itertools.islice(unbatched, transforms_batch_size)), [])
+        examples = itertools.chain.from_iterable(map(batch_transforms_fn, batches))
+    else:
+        examples = map(transforms_fn, examples)
+        examples = filter(None, examples)  # filtertoolong replaces invalid examples with None
     yield from examples
 
     src_fh.close()
@@ -89,6 +100,7 @@ class ParallelCorpus(IterableDataset):
         offset=None,
         is_train=False,
         task=None,
+        transforms_batch_size=None,
     ):
         self.src_file = src_file
         self.tgt_file = tgt_file
@@ -102,6 +114,7 @@ class ParallelCorpus(IterableDataset):
         self.offset = offset
         self.is_train = is_train
         self.corpus_id = task.corpus_id
+        self.transforms_batch_size = transforms_batch_size
 
     # FIXME: most likely redundant with mammoth.transforms.tokenize
     def _tokenize(self, string, side='src'):
@@ -135,6 +148,7 @@ class ParallelCorpus(IterableDataset):
                 if v is not None
             }
 
+        batched = self.transforms is not None and bool(self.transforms_batch_size)
         examples = read_examples_from_files(
             self.src_file,
             self.tgt_file,
@@ -149,6 +163,15 @@ class ParallelCorpus(IterableDataset):
             ),
             stride=self.stride,
             offset=self.offset,
+            batch_transforms_fn=(
+                partial(
+                    self.transforms.apply_batch,
+                    is_train=self.is_train,
+                    corpus_name=self.corpus_id,
+                )
+                if batched else None
+            ),
+            transforms_batch_size=self.transforms_batch_size,
         )
         examples = map(_cast, examples)
         yield from examples
@@ -201,6 +224,7 @@ def get_corpus(opts, task, src_vocab: Vocab, tgt_vocab: Vocab, is_train: bool =
         offset=corpus_opts.get('offset', None),
         is_train=is_train,
         task=task,
+        transforms_batch_size=opts.transforms_batch_size,
     )
     return dataset
 
@@ -244,12 +268,17 @@ def build_vocab_counts(opts, corpus_id, transforms, n_sample=3):
     # FIXME
     assert not opts.dump_samples, 'Not implemented'
 
+    transform_pipe = TransformPipe.build_from(list(transforms.values())) if transforms else None
     corpora = {
         corpus_id: read_examples_from_files(
             opts.tasks[corpus_id]["path_src"],
             opts.tasks[corpus_id]["path_tgt"],
-            # FIXME this is likely not working
-            transforms_fn=TransformPipe(transforms).apply if transforms else lambda x: x,
+            transforms_fn=transform_pipe.apply if transform_pipe else lambda x: x,
+            batch_transforms_fn=(
+                transform_pipe.apply_batch
+                if transform_pipe and opts.transforms_batch_size else None
+            ),
+            transforms_batch_size=opts.transforms_batch_size,
         )
     }
     counter_src = collections.Counter()
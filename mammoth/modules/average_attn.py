@@ -104,7 +104,8 @@ class AverageAttention(nn.Module):
         if self.aan_useffn:
             average_outputs = self.average_layer(average_outputs)
         gating_outputs = self.gating_layer(torch.cat((inputs, average_outputs), -1))
-        input_gate, forget_gate = torch.chunk(gating_outputs, 2, dim=2)
-        gating_outputs = torch.sigmoid(input_gate) * inputs + torch.sigmoid(forget_gate) * average_outputs
+        # a single sigmoid over both gates, and a fused multiply-add to combine them
+        input_gate, forget_gate = torch.chunk(torch.sigmoid(gating_outputs), 2, dim=2)
+        gating_outputs = torch.addcmul(input_gate * inputs, forget_gate, average_outputs)
 
         return gating_outputs, average_outputs
@@ -125,6 +125,14 @@ def _add_dynamic_corpus_opts(parser, build_vocab_only=False):
         choices=AVAILABLE_TRANSFORMS.keys(),
         help="Default transform pipeline to apply to data. Can be specified in each corpus of data to override.",
     )
+    group.add(
+        "-transforms_batch_size",
+        "--transforms_batch_size",
+        type=int,
+        default=1024,
+        help="Number of examples passed through the transform pipeline at once. "
+        "Set to 0 to apply the transforms one example at a time.",
+    )
 
     group.add(
         "-save_data",
@@ -390,7 +398,13 @@ def model_opts(parser):
         choices=['text'],
         help="Type of source model to use. Allows the system to incorporate non-text inputs. Options are [text].",
     )
-    group.add('--model_dtype', '-model_dtype', default='fp32', choices=['fp32', 'fp16'], help='Data type of the model.')
+    group.add(
+        '--model_dtype',
+        '-model_dtype',
+        default='fp32',
+        choices=['fp32', 'fp16', 'bf16'],
+        help='Data type of the model. bf16 uses mixed precision autocast without loss scaling.',
+    )
 
     group.add(
         '--encoder_type',
@@ -712,6 +726,14 @@ def _add_train_general_opts(parser):
     group.add(
         '--queue_size', '-queue_size', default=40, type=int, help="Size of queue for each process in producer/consumer"
     )
+    group.add(
+        '--bucket_cap_mb',
+        '-bucket_cap_mb',
+        default=25,
+        type=float,
+        help="Size in MiB of the buckets in which gradients are all-reduced. "
+             "Small buckets are bound by latency, large ones use more memory.",
+    )
 
     _add_reproducibility_opts(parser)
 
@@ -0,0 +1,199 @@
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import torch
+import torch.distributed
+import torch.multiprocessing
+
+from mammoth.distributed.communication import (
+    _can_average_in_all_reduce,
+    all_reduce_and_rescale_tensors,
+    only_ready_reduce_and_rescale_grads,
+)
+
+WORLD_SIZE = 2
+PARAM_SIZES = [3, 1000, 5, 7]
+
+
+def _run_distributed(fn, *args):
+    """Run fn(rank, world_size, *args) in WORLD_SIZE processes, in a gloo process group."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        init_method = 'file://' + os.path.join(tmp_dir, 'init')
+        torch.multiprocessing.spawn(
+            _init_and_run,
+            args=(fn, init_method, args),
+            nprocs=WORLD_SIZE,
+        )
+
+
+def _init_and_run(rank, fn, init_method, args):
+    torch.distributed.init_process_group(
+        backend='gloo',
+        init_method=init_method,
+        rank=rank,
+        world_size=WORLD_SIZE,
+    )
+    try:
+        fn(rank, WORLD_SIZE, *args)
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def _grad_value(rank, i):
+    return float(10 * (rank + 1) + i)
+
+
+def _make_params(rank, ready):
+    """Parameters with a grad on the ready ones, as left behind by the backward pass."""
+    named_parameters = []
+    for i, (size, is_ready) in enumerate(zip(PARAM_SIZES, ready)):
+        p = torch.nn.Parameter(torch.zeros(size))
+        if is_ready:
+            p.grad = torch.full((size,), _grad_value(rank, i))
+            p.has_grad = True
+        named_parameters.append((f'p{i}', p))
+    frozen = torch.nn.Parameter(torch.zeros(2), requires_grad=False)
+    named_parameters.append(('frozen', frozen))
+    return named_parameters
+
+
+def _expected_grads(ready_per_rank):
+    """The gradients as synchronized by averaging only over the ranks on which they are ready."""
+    expected = []
+    for i, size in enumerate(PARAM_SIZES):
+        ready_ranks = [rank for rank, ready in enumerate(ready_per_rank) if ready[i]]
+        value = sum(_grad_value(rank, i) for rank in ready_ranks) / max(len(ready_ranks), 1)
+        expected.append(torch.full((size,), value))
+    return expected
+
+
+def _check_only_ready_reduce(rank, world_size, ready_per_rank, buffer_size):
+    named_parameters = _make_params(rank, ready_per_rank[rank])
+    only_ready_reduce_and_rescale_grads(named_parameters, buffer_size=buffer_size)
+
+    ready_anywhere = any(any(ready) for ready in ready_per_rank)
+    for (name, p), expected in zip(named_parameters, _expected_grads(ready_per_rank)):
+        assert torch.equal(p.grad, expected), (rank, name, p.grad, expected)
+        # if anything was communicated, every device now has a grad for every parameter
+        assert getattr(p, 'has_grad', False) == ready_anywhere, (rank, name)
+    name, frozen = named_parameters[-1]
+    assert frozen.grad is None
+    assert not hasattr(frozen, 'has_grad')
+
+
+def test_only_ready_reduce_all_ready():
+    ready_per_rank = [[1, 1, 1, 1], [1, 1, 1, 1]]
+    _run_distributed(_check_only_ready_reduce, ready_per_rank, 10485760)
+
+
+def test_only_ready_reduce_partially_ready():
+    # p0 is ready on both devices, p1 and p2 on one of them each, and p3 on neither
+    ready_per_rank = [[1, 1, 0, 0], [1, 0, 1, 0]]
+    _run_distributed(_check_only_ready_reduce, ready_per_rank, 10485760)
+    # with a buffer too small to hold p1, which is then all-reduced on its own
+    _run_distributed(_check_only_ready_reduce, ready_per_rank, 64)
+
+
+def test_only_ready_reduce_none_ready():
+    ready_per_rank = [[0, 0, 0, 0], [0, 0, 0, 0]]
+    _run_distributed(_check_only_ready_reduce, ready_per_rank, 10485760)
+
+
+def test_only_ready_reduce_not_distributed():
+    assert not torch.distributed.is_initialized()
+    ready = [1, 0, 1, 0]
+    named_parameters = _make_params(0, ready)
+    only_ready_reduce_and_rescale_grads(named_parameters)
+    for i, (name, p) in enumerate(named_parameters[:-1]):
+        expected = _grad_value(0, i) if ready[i] else 0.
+        assert torch.equal(p.grad, torch.full((PARAM_SIZES[i],), expected))
+        assert p.has_grad
+
+    named_parameters = _make_params(0, [0, 0, 0, 0])
+    only_ready_reduce_and_rescale_grads(named_parameters)
+    for name, p in named_parameters[:-1]:
+        assert torch.equal(p.grad, torch.zeros_like(p))
+        assert not hasattr(p, 'has_grad')
+
+
+def _make_tensors(rank):
+    """Tensors of mixed dtypes, sized to fill buckets of 64 bytes unevenly."""
+    specs = [(10, torch.float32), (5, torch.float64), (10, torch.float32), (100, torch.float32),
+             (3, torch.float64), (4, torch.float32)]
+    return [
+        torch.arange(size, dtype=dtype) + 100 * i + (rank + 1)
+        for i, (size, dtype) in enumerate(specs)
+    ]
+
+
+def _check_all_reduce_buckets(rank, world_size, rescale_denom):
+    tensors = _make_tensors(rank)
+    expected = [sum(ts) / rescale_denom for ts in zip(*[_make_tensors(r) for r in range(world_size)])]
+    with patch('torch.distributed.all_reduce', wraps=torch.distributed.all_reduce) as all_reduce:
+        all_reduce_and_rescale_tensors(tensors, rescale_denom, buffer_size=64, max_in_flight=2)
+    # buckets split at 64 bytes per dtype: [t0], t3 on its own as it is bigger, [t2, t5], [t1, t4]
+    reduced = [args[0] for args, kwargs in all_reduce.call_args_list]
+    assert [(t.dtype, t.numel()) for t in reduced] == [
+        (torch.float32, 10), (torch.float32, 100), (torch.float32, 14), (torch.float64, 8)
+    ]
+    assert all(kwargs['op'] == torch.distributed.ReduceOp.SUM for args, kwargs in all_reduce.call_args_list)
+    for t, e in zip(tensors, expected):
+        assert t.dtype == e.dtype
+        assert torch.equal(t, e), (rank, t, e)
+
+
+def test_all_reduce_and_rescale_tensors_buckets():
+    _run_distributed(_check_all_reduce_buckets, WORLD_SIZE)
+    _run_distributed(_check_all_reduce_buckets, 1)
+
+
+def _mock_all_reduce(events):
+    """An all_reduce recording when each chunk is launched and waited for."""
+    def all_reduce(t, op, async_op):
+        i = len([event for event in events if event[0] == 'launch'])
+        events.append(('launch', i, op))
+        work = MagicMock()
+        work.wait.side_effect = lambda: events.append(('wait', i))
+        return work
+    return all_reduce
+
+
+def test_all_reduce_and_rescale_tensors_in_flight():
+    events = []
+    tensors = [torch.ones(4) for _ in range(4)]
+    with patch('torch.distributed.all_reduce', side_effect=_mock_all_reduce(events)), \
+            patch('torch.distributed.get_world_size', return_value=2), \
+            patch('torch.distributed.get_backend', return_value='nccl'):
+        all_reduce_and_rescale_tensors(tensors, 2, buffer_size=16, max_in_flight=2)
+    avg = torch.distributed.ReduceOp.AVG
+    assert events == [
+        ('launch', 0, avg), ('launch', 1, avg), ('launch', 2, avg), ('wait', 0),
+        ('launch', 3, avg), ('wait', 1), ('wait', 2), ('wait', 3),
+    ]
+    # averaged by the all-reduce itself, so not divided again
+    assert all(torch.equal(t, torch.ones(4)) for t in tensors)
+
+
+def test_can_average_in_all_reduce():
+    with patch('torch.distributed.get_world_size', return_value=2):
+        with patch('torch.distributed.get_backend', return_value='nccl'):
+            assert _can_average_in_all_reduce(2)
+            # only the average over the whole group is an AVG
+            assert not _can_average_in_all_reduce(1)
+            assert not _can_average_in_all_reduce(4)
+        with patch('torch.distributed.get_backend', return_value='gloo'):
+            assert not _can_average_in_all_reduce(2)
+
+
+def test_all_reduce_and_rescale_tensors_sum_then_divide():
+    events = []
+    tensors = [torch.full((4,), 6.), torch.full((3,), 6., dtype=torch.float64)]
+    with patch('torch.distributed.all_reduce', side_effect=_mock_all_reduce(events)), \
+            patch('torch.distributed.get_world_size', return_value=2), \
+            patch('torch.distributed.get_backend', return_value='gloo'):
+        all_reduce_and_rescale_tensors(tensors, 2)
+    sum_op = torch.distributed.ReduceOp.SUM
+    assert events == [('launch', 0, sum_op), ('launch', 1, sum_op), ('wait', 0), ('wait', 1)]
+    assert torch.equal(tensors[0], torch.full((4,), 3.))
+    assert torch.equal(tensors[1], torch.full((3,), 3., dtype=torch.float64))
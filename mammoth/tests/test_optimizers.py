@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+
+import torch
+
+import mammoth.opts
+from mammoth.utils.optimizers import Optimizer
+from mammoth.utils.parse import ArgumentParser
+
+parser = ArgumentParser(description='train.py')
+mammoth.opts.model_opts(parser)
+mammoth.opts._add_train_general_opts(parser)
+
+
+def _parse_opts(*args):
+    # -tasks option is required, but not used in this test, so dummy.
+    return parser.parse_known_args(['-tasks', 'dummy', '-node_rank', '0', *args], strict=False)[0]
+
+
+class TestOptimizer(unittest.TestCase):
+    def get_model_and_task_queue_manager(self):
+        model = torch.nn.Module()
+        model.encoder = torch.nn.Linear(4, 4)
+        model.generator = torch.nn.ModuleDict({'generator_a': torch.nn.Linear(4, 3)})
+        model.attention_bridge = torch.nn.Module()
+        task_queue_manager = MagicMock()
+        task_queue_manager.get_grouped_components.return_value = {'encoder': {'a': model.encoder}}
+        task_queue_manager.get_generators.return_value = ['a']
+        return model, task_queue_manager
+
+    def test_bf16_step(self):
+        opts = _parse_opts('-model_dtype', 'bf16', '-optim', 'adam', '-learning_rate', '0.1')
+        model, task_queue_manager = self.get_model_and_task_queue_manager()
+        optimizer = Optimizer.from_opts(model, opts, task_queue_manager)
+        self.assertTrue(optimizer.amp)
+        self.assertEqual(optimizer.amp_dtype, torch.bfloat16)
+        # bf16 has the exponent range of fp32: no loss scaling
+        self.assertIsNone(optimizer._scaler)
+
+        before = [p.detach().clone() for p in model.parameters()]
+        with torch.autocast('cpu', enabled=optimizer.amp, dtype=optimizer.amp_dtype):
+            outputs = model.generator['generator_a'](model.encoder(torch.ones(2, 4)))
+        self.assertEqual(outputs.dtype, torch.bfloat16)
+        optimizer.backward(outputs.float().sum())
+        for p in model.parameters():
+            # weights stay in fp32
+            self.assertEqual(p.grad.dtype, torch.float32)
+            p.has_grad = True
+        optimizer.step()
+        self.assertEqual(optimizer.training_step, 2)
+        for p, p_before in zip(model.parameters(), before):
+            self.assertEqual(p.dtype, torch.float32)
+            self.assertFalse(torch.equal(p, p_before))
+
+    def test_fp32_has_no_amp(self):
+        opts = _parse_opts('-optim', 'adam')
+        model, task_queue_manager = self.get_model_and_task_queue_manager()
+        optimizer = Optimizer.from_opts(model, opts, task_queue_manager)
+        self.assertFalse(optimizer.amp)
+        self.assertIsNone(optimizer._scaler)
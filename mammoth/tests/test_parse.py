@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+
+import mammoth.opts
+from mammoth.utils.parse import ArgumentParser
+
+
+class TestArgumentParserDefaults(unittest.TestCase):
+    def test_defaults_are_independent_copies(self):
+        defaults = ArgumentParser.defaults(mammoth.opts.model_opts)
+        defaults.ab_layers.append('lin')
+        defaults.model_dim = 4
+
+        fresh = ArgumentParser.defaults(mammoth.opts.model_opts)
+        self.assertEqual(fresh.ab_layers, [])
+        self.assertEqual(fresh.model_dim, -1)
+
+
+class TestValidateFile(unittest.TestCase):
+    def test_deleted_file_is_rejected_by_the_next_validation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'corpus.txt')
+            with open(file_path, 'w') as ostr:
+                ostr.write('a b c\n')
+            ArgumentParser.validate_translate_opts(Namespace(src_feats=None))
+            ArgumentParser._validate_file(file_path, info='test')
+
+            os.remove(file_path)
+            ArgumentParser.validate_translate_opts(Namespace(src_feats=None))
+            with self.assertRaises(IOError):
+                ArgumentParser._validate_file(file_path, info='test')
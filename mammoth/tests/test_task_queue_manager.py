@@ -3,6 +3,8 @@ from argparse import Namespace
 from collections import OrderedDict
 from unittest.mock import MagicMock
 
+import torch.distributed
+
 from mammoth.distributed import TaskQueueManager, WorldContext
 
 
@@ -101,8 +103,20 @@ def create_basic_task_queue_manager():
     return task_queue_manager, opts
 
 
-def test_init_basic():
-    global_task_queue_manager, opts = create_basic_task_queue_manager()
+@pytest.fixture(scope='module')
+def basic_task_queue_manager():
+    """Shared by the tests that only read from the global TQM."""
+    return create_basic_task_queue_manager()
+
+
+@pytest.fixture
+def fresh_basic_task_queue_manager():
+    """For the tests that create distributed groups, which are stored on the global TQM."""
+    return create_basic_task_queue_manager()
+
+
+def test_init_basic(basic_task_queue_manager):
+    global_task_queue_manager, opts = basic_task_queue_manager
     task_queue_manager = global_task_queue_manager.global_to_local(node_rank=0, local_rank=1, opts=opts)
     world_context = task_queue_manager.world_context
     assert world_context.is_gpu()
@@ -119,7 +133,7 @@ def test_init_basic():
     assert [task.tgt_lang for task in task_queue_manager.tasks] == ['b', 'd', 'd', 'b']
 
 
-def test_create_all_distributed_groups():
+def test_create_all_distributed_groups(fresh_basic_task_queue_manager):
     class MockGroup:
         def __init__(self):
             self.group_idx = 0
@@ -129,7 +143,7 @@ def test_create_all_distributed_groups():
             self.group_idx += 1
             return result
 
-    global_task_queue_manager, opts = create_basic_task_queue_manager()
+    global_task_queue_manager, opts = fresh_basic_task_queue_manager
     all_groups = global_task_queue_manager.create_all_distributed_groups(new_group_func=MockGroup())
     assert all_groups == {
         'src_emb': OrderedDict({
@@ -138,16 +152,17 @@ def test_create_all_distributed_groups():
         'tgt_emb': OrderedDict({
             ('b',): (0, 'Group 1 with GPU ranks [0, 2]'),
         }),
+        # components on the same gpus share the group
         'encoder': OrderedDict({
-            (0, 'x'): (0, 'Group 2 with GPU ranks [0, 1]'),
+            (0, 'x'): (0, 'Group 0 with GPU ranks [0, 1]'),
         }),
         'decoder': OrderedDict({
-            (0, 'y'): (0, 'Group 3 with GPU ranks [0, 2]'),
+            (0, 'y'): (0, 'Group 1 with GPU ranks [0, 2]'),
         }),
     }
 
 
-def test_get_distributed_groups():
+def test_get_distributed_groups(fresh_basic_task_queue_manager):
     class MockGroup:
         def __init__(self):
             self.group_idx = 0
@@ -157,12 +172,12 @@ def test_get_distributed_groups():
             self.group_idx += 1
             return result
 
-    global_task_queue_manager, opts = create_basic_task_queue_manager()
+    global_task_queue_manager, opts = fresh_basic_task_queue_manager
     task_queue_manager = global_task_queue_manager.global_to_local(node_rank=0, local_rank=1, opts=opts)
     my_groups = task_queue_manager.get_distributed_groups(new_group_func=MockGroup())
     assert my_groups == {
         'encoder': OrderedDict({
-            (0, 'x'): (0, 'Group 2 with GPU ranks [0, 1]'),
+            (0, 'x'): (0, 'Group 0 with GPU ranks [0, 1]'),
         }),
         'decoder': OrderedDict(),
         'src_emb': OrderedDict({
@@ -172,6 +187,10 @@ def test_get_distributed_groups():
         'encoder_adapters': OrderedDict(),
         'decoder_adapters': OrderedDict(),
     }
+    # only the groups including GPU 0:1 (global rank 1)
+    assert task_queue_manager.get_rankset_groups() == {
+        (0, 1): 'Group 0 with GPU ranks [0, 1]',
+    }
 
 
 def test_cpu_distributed_groups():
@@ -263,6 +282,42 @@ def test_distributed_groups_no_encoder_group():
         assert len(my_groups[component]) == 0
 
 
+def test_distributed_groups_world():
+    opt_dict = {
+        'accum_count': 1,
+        'task_distribution_strategy': 'roundrobin',
+        'world_size': 2,
+        'n_nodes': 1,
+        'enc_layers': [1],
+        'dec_layers': [1],
+        'gpu_ranks': [0, 1],
+        'tasks': {
+            'train_a-b': {
+                'path_src': 'dummy',
+                'path_tgt': 'dummy',
+                'src_tgt': 'a-b',
+                'node_gpu': '0:0',
+                'enc_sharing_group': ['x'],
+            },
+            'train_c-d': {
+                'path_src': 'dummy',
+                'path_tgt': 'dummy',
+                'src_tgt': 'c-d',
+                'node_gpu': '0:1',
+                'enc_sharing_group': ['x'],
+            },
+        }
+    }
+    opts = Namespace(**opt_dict)
+    world_context = WorldContext.from_opts(opts)
+    global_task_queue_manager = TaskQueueManager.from_opts(opts, world_context)
+    new_group_func = MagicMock().new_group_func
+    all_groups = global_task_queue_manager.create_all_distributed_groups(new_group_func=new_group_func)
+    # The encoder is on all gpus: the default group is used instead of creating a new one
+    new_group_func.assert_not_called()
+    assert all_groups['encoder'] == {(0, 'x'): (0, torch.distributed.group.WORLD)}
+
+
 # FIXME
 # def test_get_fields():
 #     mock_fields = {
@@ -289,8 +344,8 @@ def test_distributed_groups_no_encoder_group():
 #     assert fields == [('tgt', 'b', None, 'tgt b')]
 
 
-def test_basic_getters():
-    global_task_queue_manager, opts = create_basic_task_queue_manager()
+def test_basic_getters(basic_task_queue_manager):
+    global_task_queue_manager, opts = basic_task_queue_manager
     task_queue_manager = global_task_queue_manager.global_to_local(node_rank=0, local_rank=0, opts=opts)
     encoders = list(task_queue_manager.get_encoders(0))
     assert encoders == ['x']
@@ -4,6 +4,7 @@ import unittest
 import copy
 import yaml
 import math
+import random
 from argparse import Namespace
 from mammoth.transforms import (
     get_transforms_cls,
@@ -11,7 +12,9 @@ from mammoth.transforms import (
     make_transforms,
     TransformPipe,
 )
+from mammoth.transforms.transform import TransformStatistics
 from mammoth.transforms.denoising import BARTNoising
+from mammoth.transforms.filtering import _scan_repetitions
 
 
 class TestTransform(unittest.TestCase):
@@ -142,6 +145,86 @@ class TestMiscTransform(unittest.TestCase):
         ex_out = filter_transform.apply(ex_in, is_train=True)
         self.assertIsNone(ex_out)
 
+    def test_filter_too_long_batch(self):
+        filter_cls = get_transforms_cls(["filtertoolong"])["filtertoolong"]
+        opts = Namespace(src_seq_length=3, tgt_seq_length=3)
+        filter_transform = filter_cls(opts)
+        ex_ok = {"src": ["Hello", "world", "."], "tgt": ["Bonjour", "."]}
+        ex_long = {"src": ["Hello", "world", "."], "tgt": ["Bonjour", "le", "monde", "."]}
+        ex_empty = {"src": [], "tgt": ["Bonjour", "."]}
+        stats = TransformStatistics()
+        ex_out = filter_transform.apply_batch([ex_ok, ex_long, ex_empty, ex_ok], is_train=True, stats=stats)
+        self.assertEqual(ex_out, [ex_ok, ex_ok])
+        self.assertEqual(stats.observables["FilterTooLongStats"].filtered, 1)
+
+    def test_filter_word_ratio_batch(self):
+        filter_cls = get_transforms_cls(["filterwordratio"])["filterwordratio"]
+        opts = Namespace(word_ratio_threshold=3)
+        filter_transform = filter_cls(opts)
+        examples = [
+            {"src": ["a"], "tgt": ["b", "c"]},
+            {"src": ["a"], "tgt": ["b", "c", "d"]},
+            {"src": [], "tgt": ["b"]},
+        ]
+        ex_out = filter_transform.apply_batch(examples, is_train=True)
+        self.assertEqual(ex_out, examples[:1])
+
+    def test_filter_repetitions(self):
+        filter_cls = get_transforms_cls(["filterrepetitions"])["filterrepetitions"]
+        opts = Namespace(rep_threshold=2, rep_min_len=3, rep_max_len=100)
+        filter_transform = filter_cls(opts)
+        ex_in = {
+            "src": ["Hello", "world", "."],
+            "tgt": ["Bonjour", "le", "monde", "."],
+        }
+        ex_out = filter_transform.apply(ex_in, is_train=True)
+        self.assertIs(ex_out, ex_in)
+        ex_rep = {
+            "src": ["Hello", "world", "."],
+            "tgt": ["bonjour"] * 5,
+        }
+        ex_out = filter_transform.apply(ex_rep, is_train=True)
+        self.assertIsNone(ex_out)
+
+    def test_filter_repetitions_min_len(self):
+        filter_cls = get_transforms_cls(["filterrepetitions"])["filterrepetitions"]
+        opts = Namespace(rep_threshold=2, rep_min_len=3, rep_max_len=100)
+        filter_transform = filter_cls(opts)
+        # as in the OpusFilter regexp, the separator after a window counts towards rep_min_len
+        for segment, is_filtered in [
+            (["abc"] * 4, True),
+            (["no"] * 6, True),
+            (["no"] * 4 + ["x", "y", "z"], True),
+            (["a"] * 8, True),
+            # a window of rep_min_len - 1 characters needs another token after its last copy
+            (["ab"] * 4, False),
+            (["no"] * 3 + ["x", "y", "z"], False),
+            (["a"] * 7, False),
+            (["ab"] * 5, True),
+            (["no"] * 5, True),
+        ]:
+            ex_in = {"src": ["Hello", "world", "."], "tgt": segment}
+            ex_out = filter_transform.apply(ex_in, is_train=True)
+            if is_filtered:
+                self.assertIsNone(ex_out, segment)
+            else:
+                self.assertIs(ex_out, ex_in, segment)
+
+    def test_filter_repetitions_length_guard(self):
+        """The early exits on short segments never skip a segment that the full scan would flag."""
+        filter_cls = get_transforms_cls(["filterrepetitions"])["filterrepetitions"]
+        rng = random.Random(3435)
+        vocab = ["a", "no", "ab", "abc", "hello", "."]
+        for rep_threshold, rep_min_len, rep_max_len in [(2, 3, 100), (1, 2, 10), (3, 5, 20)]:
+            opts = Namespace(rep_threshold=rep_threshold, rep_min_len=rep_min_len, rep_max_len=rep_max_len)
+            filter_transform = filter_cls(opts)
+            for _ in range(2000):
+                tokens = vocab[:rng.randint(1, len(vocab))]
+                segment = [rng.choice(tokens) for _ in range(rng.randint(1, 12))]
+                token_lens = [len(token) for token in segment]
+                full_scan = _scan_repetitions(segment, token_lens, len(segment), *filter_transform._scan_args)
+                self.assertEqual(filter_transform._is_repetitive(segment), full_scan, segment)
+
 
 class TestSubwordTransform(unittest.TestCase):
     @classmethod
@@ -109,6 +109,7 @@ def build_trainer(
         dropout_steps=dropout_steps,
         task_queue_manager=task_queue_manager,
         report_stats_from_parameters=opts.report_stats_from_parameters,
+        all_reduce_buffer_size=int(opts.bucket_cap_mb * 1024 * 1024),
     )
     return trainer
 
@@ -137,6 +138,8 @@ class Trainer(object):
             model_saver(:obj:`mammoth.models.ModelSaverBase`): the saver is
                 used to save a checkpoint.
                 Thus nothing will be saved if this parameter is None
+            all_reduce_buffer_size(int): size in bytes of the buckets used
+                for the gradient all-reduce
     """
 
     def __init__(
@@ -163,6 +166,7 @@ class Trainer(object):
         dropout_steps=[0],
         task_queue_manager=None,
         report_stats_from_parameters=False,
+        all_reduce_buffer_size=26214400,
     ):
         # Basic attributes.
         self.model = model
@@ -179,6 +183,7 @@ class Trainer(object):
         self.gpu_verbose_level = gpu_verbose_level
         self.report_manager = report_manager
         self.report_stats_from_parameters = report_stats_from_parameters
+        self.all_reduce_buffer_size = all_reduce_buffer_size
         self.with_align = with_align
         self.model_saver = model_saver
         self.average_decay = average_decay
@@ -289,7 +294,9 @@ class Trainer(object):
                     in self.model.encoder.get_submodule(layer_stack_index, encoder_id).named_parameters()
                     if 'embeddings' not in name and 'adapter' not in name
                 ]
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(params, group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    params, group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
             for (layer_stack_index, decoder_id), (_, group) in self.my_decoder_groups.items():
                 params = [
@@ -297,18 +304,26 @@ class Trainer(object):
                     in self.model.decoder.get_submodule(layer_stack_index, decoder_id).named_parameters()
                     if 'embeddings' not in name and 'adapter' not in name
                 ]
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(params, group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    params, group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
             for (src_lang,), (_, group) in self.my_src_emb_groups.items():
                 embs = self.model.encoder.embeddings[f'embeddings_{src_lang}']
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(embs.named_parameters(), group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    embs.named_parameters(), group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
             for (tgt_lang,), (_, group) in self.my_tgt_emb_groups.items():
                 embs = self.model.decoder.embeddings[f'embeddings_{tgt_lang}']
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(embs.named_parameters(), group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    embs.named_parameters(), group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
                 mammoth.distributed.only_ready_reduce_and_rescale_grads(
-                    self.model.generator[f'generator_{tgt_lang}'].named_parameters(), group=group
+                    self.model.generator[f'generator_{tgt_lang}'].named_parameters(),
+                    group=group,
+                    buffer_size=self.all_reduce_buffer_size,
                 )
 
             for adapter_id, (_, group) in self.my_encoder_adapter_groups.items():
@@ -316,19 +331,23 @@ class Trainer(object):
                 adapter = self.model.encoder.get_submodule(layer_stack_index, encoder_id).get_adapter(
                     adapter_group, sub_id
                 )
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(adapter.named_parameters(), group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    adapter.named_parameters(), group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
             for adapter_id, (_, group) in self.my_decoder_adapter_groups.items():
                 layer_stack_index, decoder_id, adapter_group, sub_id = adapter_id
                 adapter = self.model.decoder.get_submodule(layer_stack_index, decoder_id).get_adapter(
                     adapter_group, sub_id
                 )
-                mammoth.distributed.only_ready_reduce_and_rescale_grads(adapter.named_parameters(), group=group)
+                mammoth.distributed.only_ready_reduce_and_rescale_grads(
+                    adapter.named_parameters(), group=group, buffer_size=self.all_reduce_buffer_size
+                )
 
             # a group is not specified: reduce across all devices
             if device_context.is_distributed():
                 mammoth.distributed.only_ready_reduce_and_rescale_grads(
-                    self.model.attention_bridge.named_parameters()
+                    self.model.attention_bridge.named_parameters(), buffer_size=self.all_reduce_buffer_size
                 )
 
             self._maybe_update_stats_from_parameters(report_stats, self.model.named_parameters())
@@ -431,7 +450,7 @@ class Trainer(object):
                 src, src_lengths = batch.src if isinstance(batch.src, tuple) else (batch.src, None)
                 tgt = batch.tgt
 
-                with torch.cuda.amp.autocast(enabled=self.optim.amp):
+                with torch.cuda.amp.autocast(enabled=self.optim.amp, dtype=self.optim.amp_dtype):
                     # F-prop through the model.
                     outputs, attns = valid_model(
                         src, tgt, src_lengths, with_align=self.with_align, metadata=metadata
@@ -497,7 +516,7 @@ class Trainer(object):
                 # 1. Create truncated target.
                 tgt = tgt_outer[j:(j + trunc_size)]
                 # TODO: AMP == TRUE If fp16
-                with torch.cuda.amp.autocast(enabled=self.optim.amp):
+                with torch.cuda.amp.autocast(enabled=self.optim.amp, dtype=self.optim.amp_dtype):
                     outputs, attns = self.model(
                         src, tgt, src_lengths, bptt=bptt, with_align=self.with_align, metadata=metadata
                     )
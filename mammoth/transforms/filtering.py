@@ -1,24 +1,73 @@
 from mammoth.transforms import register_transform
 from .transform import Transform, ObservableStats
-import re
 import math
 import itertools
 import string
 import difflib
 
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 class FilterTooLongStats(ObservableStats):
     """Runing statistics for FilterTooLongTransform."""
 
     __slots__ = ["filtered"]
 
-    def __init__(self):
-        self.filtered = 1
+    def __init__(self, filtered=1):
+        self.filtered = filtered
 
     def update(self, other: "FilterTooLongStats"):
         self.filtered += other.filtered
 
 
+def _scan_repetitions(tokens, token_lens, max_w, needed, min_chars, max_chars):
+    """Return True if a window of at most `max_w` tokens is repeated `needed` more times in a row.
+
+    Each window size `w` is checked with a single pass comparing every token with the
+    token `w` positions later: a run of `k * w` matches means the window is repeated `k`
+    more times. The repeated window must span between `min_chars` and `max_chars`
+    characters, as in the original OpusFilter regexp. Like in the regexp, the window
+    may also take in the separator space after it, counting one more character:
+    this requires another token after the last copy.
+    Works on lists of strings as well as on numpy arrays of token ids.
+    """
+    n_tokens = len(tokens)
+    for w in range(1, max_w + 1):
+        run = 0
+        for i in range(n_tokens - w):
+            if tokens[i] != tokens[i + w]:
+                run = 0
+                continue
+            run += 1
+            if run == needed * w:
+                start = i + 1 - run
+                n_chars = w - 1
+                for j in range(start, start + w):
+                    n_chars += token_lens[j]
+                if min_chars <= n_chars <= max_chars:
+                    return True
+                # the window with its trailing separator, followed by another token
+                if min_chars <= n_chars + 1 <= max_chars and i + w + 1 < n_tokens:
+                    return True
+    return False
+
+
+if njit is not None:
+    _scan_repetitions_jit = njit(cache=True)(_scan_repetitions)
+
+
+def _lengths(examples):
+    """Return the src and tgt lengths of `examples` as two numpy arrays."""
+    src_lens = np.fromiter((len(example['src']) for example in examples), dtype=np.int64, count=len(examples))
+    tgt_lens = np.fromiter((len(example['tgt']) for example in examples), dtype=np.int64, count=len(examples))
+    return src_lens, tgt_lens
+
+
 @register_transform(name='filtertoolong')
 class FilterTooLongTransform(Transform):
     """Filter out sentence that are too long."""
@@ -39,10 +88,12 @@ class FilterTooLongTransform(Transform):
 
     def apply(self, example, is_train=False, stats=None, **kwargs):
         """Return None if too long else return as is."""
+        # also filter empty strings
         src_len = len(example['src'])
+        if src_len == 0:
+            return None
         tgt_len = len(example['tgt'])
-        if src_len == 0 or tgt_len == 0:
-            # also filter empty strings
+        if tgt_len == 0:
             return None
         if src_len > self.src_seq_length or tgt_len > self.tgt_seq_length:
             if stats is not None:
@@ -51,6 +102,22 @@ class FilterTooLongTransform(Transform):
         else:
             return example
 
+    @classmethod
+    def apply_shard(cls, src_lens, tgt_lens, src_seq_length, tgt_seq_length):
+        """Return a boolean mask of the examples to keep, given their src/tgt lengths as numpy arrays."""
+        return (src_lens > 0) & (tgt_lens > 0) & (src_lens <= src_seq_length) & (tgt_lens <= tgt_seq_length)
+
+    def apply_batch(self, examples, is_train=False, stats=None, **kwargs):
+        """Return the examples that are neither empty nor too long."""
+        src_lens, tgt_lens = _lengths(examples)
+        keep = self.apply_shard(src_lens, tgt_lens, self.src_seq_length, self.tgt_seq_length)
+        if stats is not None:
+            non_empty = (src_lens > 0) & (tgt_lens > 0)
+            n_filtered = int(np.count_nonzero(non_empty & ~keep))
+            if n_filtered > 0:
+                stats.update(FilterTooLongStats(n_filtered))
+        return [example for example, kept in zip(examples, keep) if kept]
+
     def _repr_args(self):
         """Return str represent key arguments for class."""
         return '{}={}, {}={}'.format('src_seq_length', self.src_seq_length, 'tgt_seq_length', self.tgt_seq_length)
@@ -59,6 +126,9 @@ class FilterTooLongTransform(Transform):
 # Filters inspired by OpusFilter
 # https://github.com/Helsinki-NLP/OpusFilter/blob/aca40bd064d9b087c5216de0568d7fb91a31d142/opusfilter/filters.py
 
+TERMINAL_PUNCTUATION = ('.', '?', '!', '…')
+NONZERO_DIGITS = frozenset(string.digits) - {'0'}
+
 
 @register_transform(name='filterwordratio')
 class FilterWordRatio(Transform):
@@ -81,15 +151,26 @@ class FilterWordRatio(Transform):
         """Return None if too long else return as is."""
         src_len = len(example['src'])
         tgt_len = len(example['tgt'])
-        lengths = sorted([src_len, tgt_len])
-        if lengths[0] == 0:
+        shorter, longer = (src_len, tgt_len) if src_len < tgt_len else (tgt_len, src_len)
+        if shorter == 0:
             return None
+        elif longer < self.word_ratio_threshold * shorter:
+            return example
         else:
-            ratio = lengths[-1] / lengths[0]
-            if ratio < self.word_ratio_threshold:
-                return example
-            else:
-                return None
+            return None
+
+    @classmethod
+    def apply_shard(cls, src_lens, tgt_lens, word_ratio_threshold):
+        """Return a boolean mask of the examples to keep, given their src/tgt lengths as numpy arrays."""
+        shorter = np.minimum(src_lens, tgt_lens)
+        longer = np.maximum(src_lens, tgt_lens)
+        return (shorter > 0) & (longer < word_ratio_threshold * shorter)
+
+    def apply_batch(self, examples, **kwargs):
+        """Return the examples whose word length ratio is below the threshold."""
+        src_lens, tgt_lens = _lengths(examples)
+        keep = self.apply_shard(src_lens, tgt_lens, self.word_ratio_threshold)
+        return [example for example, kept in zip(examples, keep) if kept]
 
     def _repr_args(self):
         """Return str represent key arguments for class."""
@@ -98,7 +179,10 @@ class FilterWordRatio(Transform):
 
 @register_transform(name='filterrepetitions')
 class FilterRepetitions(Transform):
-    """Filter segments with repeated content. Useful e.g. for filtering data generated by a low-quality NMT model."""
+    """Filter segments with repeated content. Useful e.g. for filtering data generated by a low-quality NMT model.
+
+    Repetitions are detected over whole tokens, in time linear in the segment length for each window size.
+    """
 
     def __init__(self, opts):
         super().__init__(opts)
@@ -118,23 +202,34 @@ class FilterRepetitions(Transform):
         self.rep_threshold = self.opts.rep_threshold
         self.rep_min_len = self.opts.rep_min_len
         self.rep_max_len = self.opts.rep_max_len
+        # A hit needs rep_threshold + 2 copies of a window of at least rep_min_len characters,
+        # counting the separator after the window: the copies span at least this many characters.
+        self._min_rep_copies = self.rep_threshold + 2
+        self._min_rep_chars = self._min_rep_copies * self.rep_min_len - 1
+        self._scan_args = (self.rep_threshold + 1, self.rep_min_len, self.rep_max_len + 1)
+
+    def _is_repetitive(self, segment):
+        """Return True if a run of tokens is repeated more than `rep_threshold` times in a row.
+
+        The scan is compiled with numba if it is installed; tokens are then mapped to integer ids first.
+        """
+        n_tokens = len(segment)
+        if n_tokens < self._min_rep_copies:
+            return False
+        if sum(map(len, segment)) + n_tokens - 1 < self._min_rep_chars:
+            # too short to contain enough copies of a window of rep_min_len characters
+            return False
+        max_w = min(n_tokens // self._min_rep_copies, (self.rep_max_len + 2) // 2)
+        if njit is None:
+            return _scan_repetitions(segment, [len(token) for token in segment], max_w, *self._scan_args)
+        token_ids = {}
+        ids = np.array([token_ids.setdefault(token, len(token_ids)) for token in segment], dtype=np.int64)
+        token_lens = np.array([len(token) for token in segment], dtype=np.int64)
+        return _scan_repetitions_jit(ids, token_lens, max_w, *self._scan_args)
 
     def apply(self, example, **kwargs):
         """Return None if the repeated pattern appears more than n-threshold times."""
-        # compiled regexp for finding repetitions
-        rstring = f'(\\S.{{{self.rep_min_len-1},{self.rep_max_len}}}?)(?: *\\1){{{self.rep_threshold},}}'
-        regex = re.compile(rstring)
-        reps = []
-        for segment in example['src'], example['tgt']:
-            match = regex.search(' '.join(segment))
-            if match:
-                full = match.group(0)
-                repeated = match.group(1)
-                rep = full.count(repeated) - 1
-            else:
-                rep = 0
-            reps.append(rep)
-        if max(reps) > self.rep_threshold:
+        if self._is_repetitive(example['src']) or self._is_repetitive(example['tgt']):
             return None
         else:
             return example
@@ -164,10 +259,8 @@ class FilterTerminalPunctuation(Transform):
 
     def apply(self, example, **kwargs):
         """Return None if the penalty is smaller than the threshold."""
-        src = ' '.join(example['src'])
-        tgt = ' '.join(example['tgt'])
-        spun = len([c for c in src if c in ['.', '?', '!', '…']])
-        tpun = len([c for c in tgt if c in ['.', '?', '!', '…']])
+        spun = sum(token.count(c) for token in example['src'] for c in TERMINAL_PUNCTUATION)
+        tpun = sum(token.count(c) for token in example['tgt'] for c in TERMINAL_PUNCTUATION)
         score = abs(spun - tpun)
         if spun > 1:
             score += spun - 1
@@ -203,9 +296,10 @@ class FilterNonZeroNumerals(Transform):
 
     def apply(self, example, **kwargs):
         """Return None if the penalty is smaller than the threshold."""
-        src = ' '.join(example['src'])
-        tgt = ' '.join(example['tgt'])
-        nums = [[int(c) for c in sent if c in string.digits and c != '0'] for sent in [src, tgt]]
+        nums = [
+            [int(c) for token in segment for c in token if c in NONZERO_DIGITS]
+            for segment in (example['src'], example['tgt'])
+        ]
         for num1, num2 in itertools.combinations(nums, 2):
             seq = difflib.SequenceMatcher(None, num1, num2)
             ratio = seq.ratio()
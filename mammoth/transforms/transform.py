@@ -63,6 +63,21 @@ class Transform(object):
         """
         raise NotImplementedError
 
+    def apply_batch(self, examples, is_train=False, stats=None, **kwargs):
+        """Apply transform to a list of `examples`, dropping the filtered ones.
+
+        Override this method where the transform can be computed more
+        efficiently over many examples at once; by default, `apply` is
+        called on each example.
+
+        Args:
+            examples (list): a list of dicts of src, tgt, etc.;
+            is_train (bool): Indicate if src/tgt is training data;
+            stats (TransformStatistics): a statistic object.
+        """
+        examples = (self.apply(example, is_train=is_train, stats=stats, **kwargs) for example in examples)
+        return [example for example in examples if example is not None]
+
     def apply_reverse(self, translated):
         """Reverse the application of this transform, on the translated string.
         If a subclass does not override this, the default is a NO-OP returning
@@ -198,6 +213,19 @@ class TransformPipe(Transform):
                 break
         return example
 
+    def apply_batch(self, examples, is_train=False, **kwargs):
+        """Apply transform pipe to a list of `examples`, dropping the filtered ones.
+
+        Args:
+            examples (list): a list of dicts of src, tgt, etc.
+
+        """
+        for transform in self.transforms:
+            examples = transform.apply_batch(examples, is_train=is_train, stats=self.statistics, **kwargs)
+            if not examples:
+                break
+        return examples
+
     def apply_reverse(self, translated):
         """Reverse the transforms in the pipeline"""
         # FIXME: this should probably iterate self.transforms in reverse order
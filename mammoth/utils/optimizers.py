@@ -305,6 +305,7 @@ class Optimizer(object):
         self._decay_step = 1
         self._fp16 = None
         self._scaler = None
+        self._amp_dtype = torch.float16
 
     @classmethod
     def from_opts(cls, model, opts, task_queue_manager, checkpoint=None):
@@ -364,6 +365,10 @@ class Optimizer(object):
                 from torch.cuda.amp import GradScaler
 
                 optimizer._scaler = GradScaler()
+        elif opts.model_dtype == "bf16":
+            # bfloat16 has the exponent range of fp32, so no loss scaling is needed
+            optimizer._fp16 = "amp"
+            optimizer._amp_dtype = torch.bfloat16
 
         if optim_state_dict:
             optimizer.load_state_dict(optim_state_dict)
@@ -379,6 +384,11 @@ class Optimizer(object):
         """True if use torch amp mix precision training."""
         return self._fp16 == "amp"
 
+    @property
+    def amp_dtype(self):
+        """The data type used by torch amp autocast."""
+        return self._amp_dtype
+
     def learning_rate(self):
         """Returns the current learning rate."""
         if self._learning_rate_decay_fn is None:
@@ -408,7 +418,7 @@ class Optimizer(object):
     def backward(self, loss):
         """Wrapper for backward pass. Some optimizer requires ownership of the
         backward pass."""
-        if self.amp:
+        if self._scaler is not None:
             self._scaler.scale(loss).backward()
         elif self._fp16 == "legacy":
             kwargs = {}
@@ -426,7 +436,7 @@ class Optimizer(object):
         """
         learning_rate = self.learning_rate()
 
-        if self.amp:
+        if self._scaler is not None:
             for suboptimizer in self._optimizer.optimizers.values():
                 self._scaler.unscale_(suboptimizer)
         elif self._fp16 == "legacy":
@@ -440,7 +450,7 @@ class Optimizer(object):
             if self._max_grad_norm > 0 and self._fp16 != "legacy":
                 clip_grad_norm_(group['params'], self._max_grad_norm)
 
-        if self.amp:
+        if self._scaler is not None:
             self._scaler.step(self._optimizer)
 
             # Updates the scale for next iteration.
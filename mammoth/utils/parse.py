@@ -1,9 +1,18 @@
 import configargparse as cfargparse
+import copy
 import os
 import re
+from functools import lru_cache
+
 import torch
 import yaml
 
+try:
+    # libyaml-backed loader, much faster on large configs
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 import mammoth.opts as opts
 from mammoth.utils.logging import logger
 from mammoth.constants import CorpusName, ModelTask
@@ -13,12 +22,31 @@ RE_NODE_GPU = re.compile(r'\d+:\d+')
 RE_SRC_TGT = re.compile(r'[^-]+-[^-]+')
 
 
+def _yaml_load(stream):
+    """Equivalent to `yaml.safe_load`, using the C loader if available."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+@lru_cache(maxsize=None)
+def _files_in_dir(dir_path):
+    """Names of the regular files in `dir_path`, listed with a single `os.scandir`."""
+    try:
+        with os.scandir(dir_path) as entries:
+            return frozenset(entry.name for entry in entries if entry.is_file())
+    except OSError:
+        return frozenset()
+
+
 class DataOptsCheckerMixin(object):
     """Checker with methods for validate data related options."""
 
     @staticmethod
     def _validate_file(file_path, info):
         """Check `file_path` is valid or raise `IOError`."""
+        dir_path, file_name = os.path.split(file_path)
+        if file_name in _files_in_dir(dir_path or os.curdir):
+            return
+        # the directory listing is cached: check again in case the file was created since
         if not os.path.isfile(file_path):
             raise IOError(f"Please check path of your {info} file! {file_path}")
 
@@ -27,7 +55,7 @@ class DataOptsCheckerMixin(object):
         """Parse corpora specified in data field of YAML file."""
         if not opts.adapters:
             return
-        adapter_opts = yaml.safe_load(opts.adapters)
+        adapter_opts = _yaml_load(opts.adapters)
         # TODO: validate adapter opts
         opts.adapters = adapter_opts
 
@@ -37,7 +65,7 @@ class DataOptsCheckerMixin(object):
         default_transforms = opts.transforms
         if len(default_transforms) != 0:
             logger.info(f"Default transforms: {default_transforms}.")
-        corpora = yaml.safe_load(opts.tasks)
+        corpora = _yaml_load(opts.tasks)
         logger.info("Parsing corpora")
         n_without_node_gpu = 0
         for cname, corpus in corpora.items():
@@ -144,11 +172,11 @@ class DataOptsCheckerMixin(object):
         logger.info(f"Parsed {len(corpora)} corpora from -data.")
         opts.tasks = corpora
 
-        src_vocab = yaml.safe_load(opts.src_vocab)
+        src_vocab = _yaml_load(opts.src_vocab)
         logger.info(f"Parsed {len(src_vocab)} vocabs from -src_vocab.")
         opts.src_vocab = src_vocab
 
-        tgt_vocab = yaml.safe_load(opts.tgt_vocab)
+        tgt_vocab = _yaml_load(opts.tgt_vocab)
         logger.info(f"Parsed {len(tgt_vocab)} vocabs from -tgt_vocab.")
         opts.tgt_vocab = tgt_vocab
 
@@ -186,7 +214,7 @@ class DataOptsCheckerMixin(object):
             if cname != CorpusName.VALID and corpus["src_feats"] is not None:
                 assert opts.src_feats_vocab, "-src_feats_vocab is required if using source features."
                 if isinstance(opts.src_feats_vocab, str):
-                    opts.src_feats_vocab = yaml.safe_load(opts.src_feats_vocab)
+                    opts.src_feats_vocab = _yaml_load(opts.src_feats_vocab)
 
                 for feature in corpus["src_feats"].keys():
                     assert feature in opts.src_feats_vocab, f"No vocab file set for feature {feature}"
@@ -234,6 +262,8 @@ class DataOptsCheckerMixin(object):
     @classmethod
     def validate_prepare_opts(cls, opts, build_vocab_only=False):
         """Validate all options relate to prepare (data/transform/vocab)."""
+        # the directory listings are only shared within one validation, never with the next one
+        _files_in_dir.cache_clear()
         if opts.n_sample != 0:
             assert (
                 opts.save_data
@@ -265,12 +295,20 @@ class ArgumentParser(cfargparse.ArgumentParser, DataOptsCheckerMixin):
 
     @classmethod
     def defaults(cls, *args):
-        """Get default arguments added to a parser by all ``*args``."""
-        dummy_parser = cls()
-        for callback in args:
-            callback(dummy_parser)
-        defaults = dummy_parser.parse_known_args([])[0]
-        return defaults
+        """Get default arguments added to a parser by all ``*args``.
+
+        The defaults are computed once per combination of callbacks;
+        each call returns a deep copy, so that mutable defaults such as lists
+        are safe to modify as well.
+        """
+        if '_defaults_cache' not in cls.__dict__:
+            cls._defaults_cache = dict()
+        if args not in cls._defaults_cache:
+            dummy_parser = cls()
+            for callback in args:
+                callback(dummy_parser)
+            cls._defaults_cache[args] = dummy_parser.parse_known_args([])[0]
+        return copy.deepcopy(cls._defaults_cache[args])
 
     def parse_known_args(self, *args, strict=True, **kwargs):
         opts, unknown = super().parse_known_args(*args, **kwargs)
@@ -341,6 +379,7 @@ class ArgumentParser(cfargparse.ArgumentParser, DataOptsCheckerMixin):
 
     @classmethod
     def validate_train_opts(cls, opts):
+        _files_in_dir.cache_clear()
         if opts.epochs:
             raise AssertionError("-epochs is deprecated please use -train_steps.")
         if opts.truncated_decoder > 0 and max(opts.accum_count) > 1:
@@ -373,6 +412,7 @@ class ArgumentParser(cfargparse.ArgumentParser, DataOptsCheckerMixin):
 
     @classmethod
     def validate_translate_opts(cls, opts):
+        _files_in_dir.cache_clear()
         opts.src_feats = eval(opts.src_feats) if opts.src_feats else {}
 
     @classmethod
@@ -2,16 +2,32 @@
 # For an example config, see : OpenNMT-py-v2/examples/config_config.yaml
 import argparse
 import csv
+import gzip
+import heapq
+import json
 import logging
 import numpy as np
 import os
-import subprocess
 import time
 import yaml
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from itertools import compress
-from sklearn.cluster import AgglomerativeClustering
+from functools import lru_cache, partial
+from scipy.cluster.hierarchy import linkage as scipy_linkage
+from scipy.spatial.distance import squareform
+
+try:
+    # libyaml bindings, if available
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    # optional, faster hierarchical clustering
+    from fastcluster import linkage
+except ImportError:
+    linkage = scipy_linkage
 
 from gpu_assignment import optimize_gpu_assignment
 
@@ -27,29 +43,89 @@ def init_logging():
 
 
 def load_yaml(fname):
+    """ Load a yaml config, through a json cache stored next to it.
+
+    The cache is reused only if the modification time and size of the yaml file
+    are exactly those it was created from.
+    """
+    cache_fname = fname + '.cache.json'
+    use_cache = not os.path.basename(fname).startswith('-') and os.path.isfile(fname)
+    if use_cache:
+        # stat before reading, so that an edit during the read invalidates the cache
+        stat = os.stat(fname)
+        source = [stat.st_mtime_ns, stat.st_size]
+        try:
+            with open(cache_fname, 'r') as istr:
+                cached = json.load(istr)
+            if isinstance(cached, dict) and cached.get('source') == source:
+                return cached['config'], fname
+        except (OSError, ValueError, KeyError):
+            pass
     with open(fname, 'r') as istr:
-        config = yaml.safe_load(istr)
+        config = yaml.load(istr, Loader=SafeLoader)
+    if use_cache:
+        _write_json_cache(config, source, cache_fname)
     return config, fname
 
 
+def _write_json_cache(config, source, cache_fname):
+    try:
+        serialized = json.dumps({'source': source, 'config': config})
+    except (TypeError, ValueError):
+        # e.g. dates, which json does not support
+        return
+    if json.loads(serialized)['config'] != config:
+        # e.g. non-string keys, which json would convert to strings
+        return
+    tmp_fname = f'{cache_fname}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_fname, 'w') as ostr:
+            ostr.write(serialized)
+        os.replace(tmp_fname, cache_fname)
+    except OSError:
+        logger.warning(f'Could not write yaml cache {cache_fname}')
+        try:
+            os.remove(tmp_fname)
+        except OSError:
+            pass
+
+
 def load_distmat_csv(fname):
     with open(fname, 'r') as istr:
         reader = csv.reader(istr)
         header = next(reader)
-        data = list(reader)
+        rows = [row for row in reader if row]
     assert header[0] == 'lang', 'first column header should be lang'
-    row_headers = [d[0] for d in data]
+    row_headers = [row[0] for row in rows]
     column_headers = header[1:]
     assert row_headers == column_headers, 'provided matrix is not valid'
-    sim_data = np.array([list(map(float, d[1:])) for d in data])
+    # the row headers may be quoted and contain commas: only the numeric cells are left to numpy
+    sim_data = np.loadtxt([','.join(row[1:]) for row in rows], delimiter=',', ndmin=2, dtype=np.float32)
     return {
         'header': row_headers,
         'data': sim_data,
     }
 
 
+def _task_langs(task_config):
+    """ The (src_lang, tgt_lang) of a task.
+
+    The split of src_tgt is cached in the task under a temporary key, removed by save_yaml.
+    The cache is refreshed if src_tgt is changed.
+    """
+    src_tgt = task_config['src_tgt']
+    cached = task_config.get('_langs', None)
+    if cached is None or cached[0] != src_tgt:
+        src_lang, tgt_lang = src_tgt.split('-')
+        cached = (src_tgt, src_lang, tgt_lang)
+        task_config['_langs'] = cached
+    return cached[1:]
+
+
 def save_yaml(opts):
-    serialized = yaml.safe_dump(opts.in_config[0], default_flow_style=False, allow_unicode=True)
+    for task_config in opts.in_config[0].get('tasks', dict()).values():
+        task_config.pop('_langs', None)
+    serialized = yaml.dump(opts.in_config[0], Dumper=SafeDumper, default_flow_style=False, allow_unicode=True)
     if opts.out_config:
         with open(opts.out_config, 'w') as ostr:
             print(serialized, file=ostr)
@@ -57,19 +133,23 @@ def save_yaml(opts):
         print(serialized)
 
 
-def external_linecount(file_path):
-    """ Use external program wc to determine line count.
+def count_lines(file_path, block_size=1 << 20):
+    """ Count the lines of a file, like wc -l.
 
-    Faster than iterating over lines in python.
+    Reads the file in blocks and counts the newline bytes in C,
+    without decoding the text or spawning an external program.
     Transparently supports gzip files based on .gz ending.
     """
-    if file_path.endswith('.gz'):
-        ext_lc = subprocess.check_output(
-            ['zcat {} | wc -l'.format(file_path)], shell=True).split()[0]
-    else:
-        ext_lc = subprocess.check_output(['wc', '-l', file_path]).split()[0]
-    ext_lc = int(ext_lc.decode('utf-8'))
-    return ext_lc
+    opener = gzip.open if file_path.endswith('.gz') else partial(open, buffering=0)
+    buffer = bytearray(block_size)
+    n_lines = 0
+    with opener(file_path, 'rb') as istr:
+        while True:
+            n_read = istr.readinto(buffer)
+            if not n_read:
+                break
+            n_lines += buffer.count(b'\n', 0, n_read)
+    return n_lines
 
 
 def read_cached_linecounts(fname):
@@ -118,7 +198,7 @@ def add_complete_language_pairs_args(parser):
 
 
 def add_configs_args(parser):
-    parser.add_argument('--in_config', required=True, type=load_yaml)
+    parser.add_argument('--in_config', required=True, type=str)
     parser.add_argument('--out_config', type=str)
 
 
@@ -139,10 +219,14 @@ def add_corpora_schedule_args(parser):
         '--temperature', type=float,
         help='Temperature (1/T): 1.0 for empirical, 0.0 for uniform'
     )
+    parser.add_argument(
+        '--recount', action='store_true',
+        help='Recount the lines of all corpora, ignoring the line counts cached by previous runs'
+    )
 
 
 def add_cluster_languages_args(parser):
-    parser.add_argument('--distance_matrix', type=load_distmat_csv)
+    parser.add_argument('--distance_matrix', type=str)
     parser.add_argument('--cutoff_threshold', type=float)
     parser.add_argument('--n_groups', type=int)
 
@@ -192,7 +276,7 @@ def add_extra_fully_shared_hack_args(parser):
 
 
 def add_extra_copy_gpu_assignment_args(parser):
-    parser.add_argument('--copy_from', required=True, type=load_yaml, help='Config containing the desired assignments')
+    parser.add_argument('--copy_from', required=True, type=str, help='Config containing the desired assignments')
 
 
 def get_opts():
@@ -242,7 +326,15 @@ def get_opts():
     parser_extra_copy_gpu_assignment = subparsers.add_parser('extra_copy_gpu_assignment')
     add_extra_copy_gpu_assignment_args(parser_extra_copy_gpu_assignment)
     add_configs_args(parser_extra_copy_gpu_assignment)
-    return parser.parse_args()
+    opts = parser.parse_args()
+    # The inputs are only loaded once all arguments have been parsed successfully
+    if getattr(opts, 'in_config', None):
+        opts.in_config = load_yaml(opts.in_config)
+    if getattr(opts, 'distance_matrix', None):
+        opts.distance_matrix = load_distmat_csv(opts.distance_matrix)
+    if getattr(opts, 'copy_from', None):
+        opts.copy_from = load_yaml(opts.copy_from)
+    return opts
 
 
 def _split_large_language_pairs(opts, corpora_weights, split_treshold):
@@ -278,25 +370,45 @@ def corpora_schedule(opts):
         else cc_opts.get('use_introduce_at_training_step', False)
     )
 
+    recount = opts.recount if opts.recount else cc_opts.get('recount', False)
+
     corpora_lens_cache_file = './corpora_length_cache'
-    corpora_lens_cache = read_cached_linecounts(corpora_lens_cache_file)
-    logger.info('cached corpora_lens:')
-    for path, len in corpora_lens_cache.items():
-        logger.info(f'{path}:\t{len}')
-    corpora_lens = {}
+    if recount:
+        corpora_lens_cache = dict()
+        known_lens = dict()
+    else:
+        corpora_lens_cache = read_cached_linecounts(corpora_lens_cache_file)
+        logger.info('cached corpora_lens:')
+        for path, length in corpora_lens_cache.items():
+            logger.info(f'{path}:\t{length}')
+        # line counts stored in the tasks by a previous run
+        known_lens = {
+            cname: corpus['num_lines']
+            for cname, corpus in opts.in_config[0]['tasks'].items()
+            if 'num_lines' in corpus
+        }
+    # Count the uncached corpora concurrently: the counting is mostly waiting for IO
+    uncached_paths = list(dict.fromkeys(
+        corpus['path_src'] for cname, corpus in opts.in_config[0]['tasks'].items()
+        if cname not in known_lens and corpus['path_src'] not in corpora_lens_cache
+    ))
+    if uncached_paths:
+        with ThreadPoolExecutor(max_workers=min(32, len(uncached_paths))) as executor:
+            lengths = list(executor.map(count_lines, uncached_paths))
+        with open(corpora_lens_cache_file, 'a') as cache_out:
+            for path, length in zip(uncached_paths, lengths):
+                corpora_lens_cache[path] = length
+                print(f'{length}\t{path}', file=cache_out)
+                logger.info(f'{length}\t{path}')
+    corpora_lens = {
+        cname: known_lens[cname] if cname in known_lens else corpora_lens_cache[corpus['path_src']]
+        for cname, corpus in opts.in_config[0]['tasks'].items()
+    }
     for cname, corpus in opts.in_config[0]['tasks'].items():
-        if corpus['path_src'] in corpora_lens_cache:
-            length = corpora_lens_cache[corpus['path_src']]
-            corpora_lens[cname] = length
-        else:
-            length = external_linecount(corpus['path_src'])
-            corpora_lens[cname] = length
-            with open(corpora_lens_cache_file, 'a') as cache_out:
-                print(f'{length}\t{corpus["path_src"]}', file=cache_out)
-                logger.info(f'{length}\t{corpus["path_src"]}')
+        corpus['num_lines'] = corpora_lens[cname]
     logger.info('final corpora_lens:')
-    for cname, len in corpora_lens.items():
-        logger.info(f'{cname}:\t{len}')
+    for cname, length in corpora_lens.items():
+        logger.info(f'{cname}:\t{length}')
 
     tot_lines = sum(corpora_lens.values())
     corpora_weights = {
@@ -309,7 +421,7 @@ def corpora_schedule(opts):
 
     min_introduce_at_training_step = opts.in_config[0].get('train_steps', 100_000)
     for cname, corpus in opts.in_config[0]['tasks'].items():
-        src_lang, tgt_lang = corpus['src_tgt'].split('-')
+        src_lang, tgt_lang = _task_langs(corpus)
         weight = corpora_weights[cname]
         if use_weight and use_introduce_at_training_step:
             weight = float(np.sqrt(weight))
@@ -359,32 +471,37 @@ def cluster_languages(opts):
         distance_matrix = load_distmat_csv(distance_matrix_path)
 
     sim_langs = set(distance_matrix['header'])
-    corpus_langs = set()
-    for cname, corpus in opts.in_config[0]['tasks'].items():
-        assert all([(lng in sim_langs) for lng in corpus['src_tgt'].split('-')]), \
-            f'corpus {cname}: one language (either {" or ".join(corpus["src_tgt"].split("-"))} ' \
-            f'was not found in the distance matrix (supports {" ".join(sim_langs)})'
-        corpus_langs = corpus_langs | set(corpus['src_tgt'].split('-'))
+    corpus_langs = {
+        lng for corpus in opts.in_config[0]['tasks'].values() for lng in _task_langs(corpus)
+    }
+    missing_langs = corpus_langs - sim_langs
+    if missing_langs:
+        # only search for the offending corpora when reporting the error
+        missing_corpora = [
+            cname for cname, corpus in opts.in_config[0]['tasks'].items()
+            if not missing_langs.isdisjoint(_task_langs(corpus))
+        ]
+        raise AssertionError(
+            f'corpora {" ".join(missing_corpora)}: languages {" ".join(sorted(missing_langs))} '
+            f'were not found in the distance matrix (supports {" ".join(sim_langs)})'
+        )
     if sim_langs != corpus_langs:
         logger.warning(
             f"languages in the distance matrix are unused ({', ' .join(sim_langs - corpus_langs)})"
         )
         # Omit unused languages before clustering. Otherwise they might consume entire clusters.
-        selector = [lang in corpus_langs for lang in distance_matrix['header']]
-        dist = distance_matrix['data']
-        dist = dist[selector][:, selector]
-        header = list(compress(distance_matrix['header'], selector))
+        all_langs = np.asarray(distance_matrix['header'])
+        selector = np.isin(all_langs, list(corpus_langs))
+        # gather the selected rows and columns at once, without an intermediate copy of the selected rows
+        idx = np.flatnonzero(selector)
+        dist = distance_matrix['data'][np.ix_(idx, idx)]
+        header = all_langs[idx].tolist()
         distance_matrix = {
             'data': dist,
             'header': header,
         }
 
-    group_idx = AgglomerativeClustering(
-        n_clusters=n_groups,
-        metric='precomputed',
-        linkage='average',
-        distance_threshold=cutoff_threshold,
-    ).fit_predict(distance_matrix['data']).tolist()
+    group_idx = _average_linkage_clusters(distance_matrix['data'], n_groups, cutoff_threshold)
     groups = {lang: f'group{idx}' for lang, idx in zip(distance_matrix['header'], group_idx)}
     # A potential solution would be to save everything in the config structure:
     #   - Configuration for the config-config (what is now specified as CLI params)
@@ -401,6 +518,53 @@ def cluster_languages(opts):
     logger.info(f'step took {duration} s')
 
 
+def _average_linkage_clusters(dist, n_clusters=None, distance_threshold=None):
+    """ Agglomerative clustering with average linkage of a precomputed distance matrix.
+
+    Gives the same labels as sklearn's AgglomerativeClustering,
+    but the linkage is computed by fastcluster (if installed) or scipy.
+    Exactly one of n_clusters and distance_threshold must be set.
+    If there are at least as many clusters as leaves, each leaf is its own cluster,
+    numbered in matrix order (where sklearn would raise for too many clusters).
+    """
+    if (n_clusters is None) == (distance_threshold is None):
+        raise ValueError('Exactly one of n_groups and cutoff_threshold has to be set')
+    n_leaves = len(dist)
+    if n_clusters is not None and n_clusters > n_leaves:
+        logger.warning(
+            f'n_groups ({n_clusters}) is larger than the number of languages ({n_leaves}): '
+            'each language is put in a group of its own'
+        )
+    # Trivial cases, without computing the linkage
+    if n_leaves < 2 or n_clusters == 1:
+        return [0] * n_leaves
+    if n_clusters is not None and n_clusters >= n_leaves:
+        # each language is its own cluster
+        return list(range(n_leaves))
+    merges = linkage(squareform(dist, checks=False), method='average')
+    if distance_threshold is not None:
+        # merges at or above the threshold are not performed
+        n_clusters = int(np.count_nonzero(merges[:, 2] >= distance_threshold)) + 1
+    children = merges[:, :2].astype(np.intp)
+    # Cut the tree by repeatedly splitting the most recently merged cluster
+    # (a max-heap of cluster ids), labeling the clusters in the same order as sklearn.
+    nodes = [-(2 * n_leaves - 2)]
+    for _ in range(min(n_clusters, n_leaves) - 1):
+        left, right = children[-nodes[0] - n_leaves]
+        heapq.heappush(nodes, -left)
+        heapq.heappushpop(nodes, -right)
+    labels = [0] * n_leaves
+    for label, node in enumerate(nodes):
+        stack = [-node]
+        while stack:
+            node = stack.pop()
+            if node < n_leaves:
+                labels[node] = label
+            else:
+                stack.extend(children[node - n_leaves].tolist())
+    return labels
+
+
 def sharing_groups(opts):
     start = time.time()
 
@@ -415,7 +579,7 @@ def sharing_groups(opts):
     assert len(enc_sharing_groups) == len(opts.in_config[0]['enc_layers'])
     assert len(dec_sharing_groups) == len(opts.in_config[0]['dec_layers'])
     for cname, corpus in opts.in_config[0]['tasks'].items():
-        src, tgt = corpus['src_tgt'].split('-')
+        src, tgt = _task_langs(corpus)
         mapping_src = {
             'LANGUAGE': src,
             'GROUP': groups[src],
@@ -453,7 +617,7 @@ def set_transforms(opts):
     transforms = opts.transforms if opts.transforms else cc_opts.get('transforms', [])
 
     for cname, corpus in opts.in_config[0]['tasks'].items():
-        src, tgt = corpus['src_tgt'].split('-')
+        src, tgt = _task_langs(corpus)
         if src == tgt:
             corpus['transforms'] = list(ae_transforms)
         else:
@@ -483,7 +647,7 @@ def allocate_devices(opts):
     lps_ready_to_start = []
     lp_to_key = defaultdict(list)
     for key, tasks_config in opts.in_config[0]['tasks'].items():
-        src_lang, tgt_lang = tasks_config['src_tgt'].split('-')
+        src_lang, tgt_lang = _task_langs(tasks_config)
         ready_to_start = tasks_config.get('introduce_at_training_step', 0) == 0
 
         lang_pairs.append((src_lang, tgt_lang))
@@ -553,44 +717,49 @@ def adapter_config(opts):
     if 'adapters' not in opts.in_config[0]:
         logger.warning('No adapter configuration, skipping this step')
         return
+    groups = cc_opts['groups']
     src_langs, tgt_langs = _get_langs(opts)
-    src_groups = list(sorted(set(cc_opts['groups'][src] for src in src_langs)))
-    tgt_groups = list(sorted(set(cc_opts['groups'][tgt] for tgt in tgt_langs)))
+    src_groups = list(sorted(set(groups[src] for src in src_langs)))
+    tgt_groups = list(sorted(set(groups[tgt] for tgt in tgt_langs)))
     encoder_adapters = opts.in_config[0]['adapters'].get('encoder', [])
     decoder_adapters = opts.in_config[0]['adapters'].get('decoder', [])
-    for task_key, task_config in opts.in_config[0]['tasks'].items():
+    # split the language pairs and look up their groups once, instead of once per adapter
+    task_langs = [
+        (task_config, *_task_langs(task_config))
+        for task_config in opts.in_config[0]['tasks'].values()
+    ]
+    task_configs = [task_config for task_config, _, _ in task_langs]
+    task_src_groups = [groups[task_src] for _, task_src, _ in task_langs]
+    task_tgt_groups = [groups[task_tgt] for _, _, task_tgt in task_langs]
+    for task_config in task_configs:
         if 'adapters' not in task_config:
             task_config['adapters'] = {'encoder': [], 'decoder': []}
     # TODO: refactor and add support for {SRC|TGT}_{LANGUAGE|GROUP} also to adapters
     for adapter_name, adapter_config in sorted(encoder_adapters.items()):
         if adapter_config['ids'] == 'LANGUAGE':
             adapter_config['ids'] = list(src_langs)
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
-                task_src, task_tgt = task_config['src_tgt'].split('-')
+            for task_config, task_src, task_tgt in task_langs:
                 task_config['adapters']['encoder'].append([adapter_name, task_src])
         elif adapter_config['ids'] == 'GROUP':
             adapter_config['ids'] = list(src_groups)
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
-                task_src, task_tgt = task_config['src_tgt'].split('-')
-                task_config['adapters']['encoder'].append([adapter_name, cc_opts['groups'][task_src]])
+            for task_config, group in zip(task_configs, task_src_groups):
+                task_config['adapters']['encoder'].append([adapter_name, group])
         elif adapter_config['ids'] == 'FULL':
             adapter_config['ids'] = ['full']
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
+            for task_config in task_configs:
                 task_config['adapters']['encoder'].append([adapter_name, 'full'])
     for adapter_name, adapter_config in sorted(decoder_adapters.items()):
         if adapter_config['ids'] == 'LANGUAGE':
             adapter_config['ids'] = list(tgt_langs)
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
-                task_src, task_tgt = task_config['src_tgt'].split('-')
+            for task_config, task_src, task_tgt in task_langs:
                 task_config['adapters']['decoder'].append([adapter_name, task_tgt])
         elif adapter_config['ids'] == 'GROUP':
             adapter_config['ids'] = list(tgt_groups)
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
-                task_src, task_tgt = task_config['src_tgt'].split('-')
-                task_config['adapters']['decoder'].append([adapter_name, cc_opts['groups'][task_tgt]])
+            for task_config, group in zip(task_configs, task_tgt_groups):
+                task_config['adapters']['decoder'].append([adapter_name, group])
         elif adapter_config['ids'] == 'FULL':
             adapter_config['ids'] = ['full']
-            for task_key, task_config in opts.in_config[0]['tasks'].items():
+            for task_config in task_configs:
                 task_config['adapters']['decoder'].append([adapter_name, 'full'])
     opts.in_config[0]['adapters']['encoder'] = encoder_adapters
     opts.in_config[0]['adapters']['decoder'] = decoder_adapters
@@ -669,14 +838,35 @@ def _write_translation_config(
         result['tgt_subword_model'] = tgt_subword_model
     translation_config_path = f'{translation_config_dir}/trans.{supervision}.{src_lang}-{tgt_lang}.yaml'
     with open(translation_config_path, 'w') as fout:
-        serialized = yaml.safe_dump(result, default_flow_style=False, allow_unicode=True)
+        serialized = yaml.dump(result, Dumper=SafeDumper, default_flow_style=False, allow_unicode=True)
         print(serialized, file=fout)
 
 
+@lru_cache(maxsize=None)
+def _listdir(dir_path):
+    try:
+        return frozenset(os.listdir(dir_path))
+    except OSError:
+        return frozenset()
+
+
+def _path_exists(path):
+    """ Like os.path.exists, but reads each directory only once.
+
+    Checking the candidate paths of all language pairs one by one costs
+    two stat calls per pair, while the corpora are typically in a few directories.
+    """
+    dir_path, name = os.path.split(path)
+    return name in _listdir(dir_path or os.curdir)
+
+
 def _get_langs(opts):
-    src_langs = list(sorted(opts.in_config[0]['src_vocab'].keys()))
-    tgt_langs = list(sorted(opts.in_config[0]['tgt_vocab'].keys()))
-    return src_langs, tgt_langs
+    # The vocab languages do not change between the steps: sort them only once
+    if getattr(opts, '_langs', None) is None:
+        src_langs = list(sorted(opts.in_config[0]['src_vocab'].keys()))
+        tgt_langs = list(sorted(opts.in_config[0]['tgt_vocab'].keys()))
+        opts._langs = (src_langs, tgt_langs)
+    return opts._langs
 
 
 def complete_language_pairs(opts):
@@ -739,7 +929,7 @@ def complete_language_pairs(opts):
                 tgt_path = tgt_path_template.format(**template_variables)
                 valid_src_path = valid_src_path_template.format(**template_variables)
                 valid_tgt_path = valid_tgt_path_template.format(**template_variables)
-            if os.path.exists(src_path) and os.path.exists(tgt_path):
+            if _path_exists(src_path) and _path_exists(tgt_path):
                 _add_language_pair(opts, src_lang, tgt_lang, src_path, tgt_path, valid_src_path, valid_tgt_path)
             else:
                 logger.warning(f'Paths do NOT exist, omitting language pair: {src_path} {tgt_path}')
@@ -763,9 +953,10 @@ def _add_language_pair(opts, src_lang, tgt_lang, src_path, tgt_path, valid_src_p
     if key not in tasks_section:
         tasks_section[key] = dict()
     tasks_section[key]['src_tgt'] = f'{src_lang}-{tgt_lang}'
+    tasks_section[key]['_langs'] = (tasks_section[key]['src_tgt'], src_lang, tgt_lang)
     tasks_section[key]['path_src'] = src_path
     tasks_section[key]['path_tgt'] = tgt_path
-    if valid_src_path is not None and os.path.exists(valid_src_path):
+    if valid_src_path is not None and _path_exists(valid_src_path):
         tasks_section[key]['path_valid_src'] = valid_src_path
         tasks_section[key]['path_valid_tgt'] = valid_tgt_path
 
@@ -814,7 +1005,7 @@ def extra_fully_shared_hack(opts):
                 task_opts['transforms'].insert(-1, 'prefix')
             else:
                 task_opts['transforms'].append('prefix')
-            task_src, task_tgt = task_opts['src_tgt'].split('-')
+            task_src, task_tgt = _task_langs(task_opts)
             task_opts['src_prefix'] = f'<to_{task_src}>'
             task_opts['tgt_prefix'] = ''
 